@@ -0,0 +1,266 @@
+"""Замеры скорости на синтетических базах: слой данных и окно без экрана.
+
+Примеры:
+    python bench.py --out bench.json
+    python bench.py --sizes 1000 10000 --repeat 20 --out before.json
+    python bench.py --plans-only
+
+Базы генерируются один раз (детерминированно, по --seed) и хранятся в --data-dir;
+замеры идут на их копиях. Каждый размер замеряется в отдельном процессе, чтобы
+пиковая память (peak_rss_kib) относилась только к нему. Времена — в миллисекундах.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import resource
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from database import (TaskDatabase, STATUS_PENDING, STATUS_DONE, STATUS_OVERDUE, DEFAULT_CATEGORIES,
+                      archive_name)
+
+SIZES = (1000, 10000, 100000, 1000000)
+PLAN_SIZES = (5, 1000, 100000)  # для --plans-only: планы на крошечной базе портит статистика ANALYZE
+GENERATE_CHUNK = 50000
+BULK_SIZE = 1000  # строк в массовых операциях, но не больше десятой части базы
+
+# Распределения, похожие на живую базу: больше половины задач выполнено,
+# у заметной части нет категории, дедлайны в основном в прошлом
+CATEGORY_WEIGHTS = [(category, 10) for category in DEFAULT_CATEGORIES] + [
+    ("Здоровье", 4), ("Финансы", 3), ("Путешествия", 1), (None, 8)]
+WORDS = ("отчёт", "встреча", "купить", "позвонить", "проект", "письмо", "оплатить", "прочитать",
+         "записаться", "подготовить", "курс", "лекция", "ремонт", "документы", "план", "неделя")
+
+
+def dataset_rows(size, seed):
+    """Строки (title, notes, deadline, status, category) для insert_many"""
+    rng = random.Random(seed)
+    categories, weights = zip(*CATEGORY_WEIGHTS)
+    today = date.today()
+    for _ in range(size):
+        title = " ".join(rng.choices(WORDS, k=rng.randint(2, 5))).capitalize()
+        notes = " ".join(rng.choices(WORDS, k=rng.randint(3, 30))) if rng.random() < 0.4 else ""
+        status = STATUS_DONE if rng.random() < 0.6 else STATUS_PENDING
+        offset = rng.randint(-365, 0) if status == STATUS_DONE else int(rng.gauss(5, 30))
+        deadline = (today + timedelta(days=offset)).isoformat() if rng.random() < 0.95 else None
+        yield title, notes, deadline, status, rng.choices(categories, weights)[0]
+
+
+def dataset_path(data_dir, size, seed):
+    """Файл синтетической базы; создаётся при первом обращении"""
+    path = os.path.join(data_dir, f"tasks_{size}_{seed}.sqlite")
+    if not os.path.exists(path):
+        os.makedirs(data_dir, exist_ok=True)
+        tmp_path = path + ".tmp"
+        db = TaskDatabase(tmp_path)
+        rows = dataset_rows(size, seed)
+        with db.bulk_mode():
+            while chunk := [row for _, row in zip(range(GENERATE_CHUNK), rows)]:
+                db.insert_many(chunk)
+        db.maintain()
+        db.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        db.conn.close()
+        os.replace(tmp_path, path)
+        os.remove(archive_name(tmp_path))
+    return path
+
+
+def percentile(sorted_values, fraction):
+    """Перцентиль по ближайшему рангу"""
+    index = min(len(sorted_values) - 1, max(0, round(fraction * len(sorted_values) + 0.5) - 1))
+    return sorted_values[index]
+
+
+def summary(samples):
+    samples = sorted(samples)
+    return {"n": len(samples), "min": samples[0], "p50": percentile(samples, 0.5),
+            "p90": percentile(samples, 0.9), "p99": percentile(samples, 0.99), "max": samples[-1]}
+
+
+class Timings:
+    def __init__(self, repeat):
+        self.repeat = repeat
+        self.results = {}
+
+    def measure(self, name, func, setup=None, repeat=None):
+        """Замеряет func() repeat раз; setup() перед каждым замером не входит во время"""
+        samples = []
+        for _ in range(repeat or self.repeat):
+            if setup:
+                setup()
+            start = time.perf_counter()
+            func()
+            samples.append((time.perf_counter() - start) * 1000)
+        self.results[name] = summary(samples)
+
+
+def bench_database(timings, db, work_dir):
+    from csv_io import export_csv
+
+    for category in (None, DEFAULT_CATEGORIES[0]):
+        for status in (None, STATUS_PENDING, STATUS_DONE, STATUS_OVERDUE):
+            for search in ("", "отчёт"):
+                name = f"get_tasks[{category or '*'}|{status or '*'}|{search or '*'}]"
+                timings.measure(name, lambda: db.get_tasks(category, status, search))
+                timings.measure(name.replace("get_tasks", "get_task_page"),
+                                lambda: db.get_task_page(category, status, search, preview=True))
+    timings.measure("get_stats", db.get_stats)
+    timings.measure("get_facet_counts", db.get_facet_counts)
+    timings.measure("export_csv", lambda: export_csv(db, os.path.join(work_dir, "export.csv")))
+
+
+def bench_window(timings, bulk_size):
+    from PyQt6.QtCore import QCoreApplication, QEventLoop, QTimer, QItemSelection, QItemSelectionModel
+    from PyQt6.QtWidgets import QApplication
+    import main
+
+    app = QApplication.instance() or QApplication(sys.argv[:1])
+    # Архивация и VACUUM по таймеру во время замеров только исказили бы их
+    main.ToDoApp.MAINTENANCE_DELAY_MS = 24 * 3600 * 1000
+    window = main.ToDoApp()
+    window.show()
+    view = window.task_list_view
+
+    def wait_until(condition, timeout=120):
+        deadline = time.perf_counter() + timeout
+        while not condition():
+            if time.perf_counter() > deadline:
+                raise TimeoutError("окно не дождалось ответа потока базы")
+            QCoreApplication.processEvents(QEventLoop.ProcessEventsFlag.AllEvents, 5)
+
+    def load():
+        loop = QEventLoop()
+        window.tasks_loaded.connect(loop.quit)
+        QTimer.singleShot(0, window.load_tasks)
+        loop.exec()
+        window.tasks_loaded.disconnect(loop.quit)
+
+    def write_and_wait(method):
+        # Как ToDoApp.write; изменение считается применённым, когда окно забрало его из журнала
+        done = []
+        window.worker.call(method, window.selected_ids(), callback=done.append)
+        wait_until(lambda: done)
+        window.poll_changes(force=True)
+        wait_until(lambda: not window.polling and not window.loading)
+
+    def select_bulk():
+        # Массовые операции идут над первыми bulk_size строками, недостающие подгружаются
+        model = window.task_model
+        while model.rowCount() < bulk_size and window.next_key:
+            model.fetchMore()  # как представление: повторный запрос той же страницы модель не пропустит
+            wait_until(lambda: not window.loading)
+        view.clearSelection()
+        view.selectionModel().select(QItemSelection(model.index(0), model.index(min(bulk_size, model.rowCount()) - 1)),
+                                     QItemSelectionModel.SelectionFlag.Select)
+
+    load()
+    timings.measure("ToDoApp.load_tasks", load)
+    timings.measure("ToDoApp.toggle_theme", lambda: (window.toggle_theme(), view.viewport().repaint()))
+    # Выделение рисует делегат; замеряется смена выделения вместе с перерисовкой
+    timings.measure("select_all_repaint", lambda: (view.selectAll(), view.viewport().repaint()),
+                    setup=view.clearSelection)
+    timings.measure("bulk_toggle", lambda: write_and_wait("toggle_status_many"), setup=select_bulk)
+    timings.measure("bulk_remove", lambda: write_and_wait("delete_many"), setup=select_bulk,
+                    repeat=min(timings.repeat, 3))
+
+    window.close()
+    app.processEvents()
+
+
+def check_plans(db):
+    """Запросы списка, которые просматривают tasks целиком; печатает их в stderr"""
+    offenders = db.full_scan_list_queries()
+    for query, plan in offenders:
+        print(f"полный просмотр: {' '.join(query.split())[:120]}\n  {plan}", file=sys.stderr)
+    return len(offenders)
+
+
+def run_size(size, seed, repeat, data_dir):
+    """Замеры одного размера базы; выполняется в отдельном процессе"""
+    source = dataset_path(data_dir, size, seed)
+    timings = Timings(repeat)
+    with tempfile.TemporaryDirectory() as work_dir:
+        db_path = os.path.join(work_dir, "tasks_v2.sqlite")
+        shutil.copyfile(source, db_path)
+        db = TaskDatabase(db_path)
+        full_scans = check_plans(db)
+        bench_database(timings, db, work_dir)
+        db.conn.close()
+
+        # Окно открывает tasks_v2.sqlite из текущего каталога
+        cwd = os.getcwd()
+        os.chdir(work_dir)
+        try:
+            bench_window(timings, max(1, min(BULK_SIZE, size // 10)))
+        finally:
+            os.chdir(cwd)
+    return {"rows": size, "peak_rss_kib": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+            "full_scan_queries": full_scans, "timings": timings.results}
+
+
+def environment():
+    from PyQt6.QtCore import PYQT_VERSION_STR
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        commit = ""
+    return {"commit": commit, "date": time.strftime("%Y-%m-%dT%H:%M:%S"), "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version, "pyqt": PYQT_VERSION_STR, "platform": platform.platform()}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Замеры скорости ToDo Список Pro на синтетических базах")
+    parser.add_argument("--sizes", type=int, nargs="+", help="размеры баз в строках")
+    parser.add_argument("--repeat", type=int, default=5, help="замеров каждой операции")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--data-dir", default="bench_data", help="каталог для сгенерированных баз")
+    parser.add_argument("--out", help="файл для JSON с результатами (по умолчанию stdout)")
+    parser.add_argument("--plans-only", action="store_true",
+                        help="только проверить планы запросов списка; код выхода 1, если есть полный просмотр")
+    parser.add_argument("--child", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.plans_only:
+        full_scans = 0
+        for size in args.sizes or PLAN_SIZES:
+            db = TaskDatabase(dataset_path(args.data_dir, size, args.seed))
+            count = check_plans(db)
+            db.conn.close()
+            print(f"{size} строк: запросов с полным просмотром {count}", file=sys.stderr)
+            full_scans += count
+        return 1 if full_scans else 0
+
+    if args.child:
+        json.dump(run_size(args.child, args.seed, args.repeat, args.data_dir), sys.stdout)
+        return 0
+
+    results = []
+    for size in args.sizes or SIZES:
+        print(f"{size} строк...", file=sys.stderr)
+        child = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--child", str(size), "--seed", str(args.seed),
+             "--repeat", str(args.repeat), "--data-dir", os.path.abspath(args.data_dir)],
+            stdout=subprocess.PIPE, check=True)
+        results.append(json.loads(child.stdout))
+
+    report = json.dumps({"environment": environment(), "results": results}, ensure_ascii=False, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as file:
+            file.write(report + "\n")
+    else:
+        print(report)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,193 @@
+"""Работа с задачами из командной строки, без запуска интерфейса.
+
+Примеры:
+    python cli.py add "Сдать отчёт" --deadline 2026-11-01 --category Учеба
+    python cli.py list --status overdue
+    python cli.py list --category Учеба --ids | xargs python cli.py done
+    python cli.py export tasks.csv
+    python cli.py list --archive --search отчёт
+    python cli.py maintain --days 60
+    python cli.py snapshot
+    python cli.py restore snapshots/tasks_v2-20261018-153000-123456.sqlite
+"""
+import argparse
+import os
+import sys
+from datetime import date
+from profiling import tracer, enable as enable_profiling
+from database import (TaskDatabase, STATUS_PENDING, STATUS_DONE, STATUS_OVERDUE, ARCHIVE_AFTER_DAYS, today_str,
+                      describe_commits)
+
+STATUSES = {"pending": STATUS_PENDING, "done": STATUS_DONE, "overdue": STATUS_OVERDUE}
+
+
+def deadline_arg(text):
+    try:
+        return date.fromisoformat(text).isoformat()
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"ожидается дата вида ГГГГ-ММ-ДД: {text}")
+
+
+def cmd_add(db, args):
+    print(db.add_task(args.title, args.notes, args.deadline or today_str(), args.category))
+
+
+def cmd_list(db, args):
+    filters = (args.category, STATUSES.get(args.status), args.search)
+    if args.archive:
+        chunks = [db.search_archive(args.search, limit=args.limit or -1)]
+    elif args.limit:
+        chunks = [db.get_task_page(*filters, limit=args.limit, preview=True)[0]]
+    else:
+        chunks = db.iter_tasks(*filters, preview=True)
+
+    for rows in chunks:
+        if args.ids:
+            sys.stdout.write("".join(f"{row[0]}\n" for row in rows))
+        else:
+            sys.stdout.write("".join(
+                f"{tid}\t{status}\t{deadline or ''}\t{category or ''}\t{title}\n"
+                for tid, title, _, deadline, status, category in rows))
+
+
+def cmd_set_status(status):
+    def run(db, args):
+        print(db.set_status_many(args.ids, status))
+    return run
+
+
+def cmd_history(method, empty):
+    def run(db, args):
+        label = getattr(db, method)()
+        if label:
+            print(label)
+        else:
+            print(empty, file=sys.stderr)
+    return run
+
+
+def cmd_export(db, args):
+    from csv_io import export_csv
+    print(export_csv(db, args.path, include_archive=args.with_archive))
+
+
+def cmd_import(db, args):
+    from csv_io import import_csv
+    added, skipped = import_csv(db, args.path)
+    print(added)
+    if skipped:
+        print(f"Пропущено некорректных строк: {skipped}", file=sys.stderr)
+
+
+def cmd_maintain(db, args):
+    archived = 0
+    while moved := db.archive_done(args.days):
+        archived += moved
+    db.maintain()
+    print(archived)
+
+
+def cmd_snapshot(db, args):
+    from snapshots import take_snapshot, describe_snapshot, SNAPSHOT_KEEP
+    stats = take_snapshot(args.db, keep=SNAPSHOT_KEEP if args.keep is None else args.keep)
+    print(stats["path"])
+    print(describe_snapshot(stats), file=sys.stderr)
+
+
+def cmd_snapshots(db, args):
+    from snapshots import list_snapshots
+    for path, taken, size in list_snapshots(args.db):
+        print(f"{taken:%Y-%m-%d %H:%M:%S}\t{size}\t{path}")
+
+
+def cmd_restore(db, args):
+    from snapshots import restore_snapshot
+    saved = restore_snapshot(db, args.path)
+    print(f"Прежнее состояние сохранено снимком {saved['path']}", file=sys.stderr)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Задачи ToDo Список Pro из командной строки")
+    parser.add_argument("--db", default="tasks_v2.sqlite", help="файл базы (по умолчанию tasks_v2.sqlite)")
+    parser.add_argument("--profile", action="store_true", help="напечатать в stderr замеры запросов к базе")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    add = commands.add_parser("add", help="добавить задачу; печатает её id")
+    add.add_argument("title")
+    add.add_argument("--notes", default="")
+    add.add_argument("--deadline", type=deadline_arg, help="ГГГГ-ММ-ДД, по умолчанию сегодня")
+    add.add_argument("--category")
+    add.set_defaults(func=cmd_add)
+
+    lst = commands.add_parser("list", help="список задач в порядке приложения, через табуляцию")
+    lst.add_argument("--category")
+    lst.add_argument("--status", choices=STATUSES)
+    lst.add_argument("--search")
+    lst.add_argument("--limit", type=int, help="вывести не больше N задач")
+    lst.add_argument("--ids", action="store_true", help="печатать только id")
+    lst.add_argument("--archive", action="store_true",
+                     help="искать в архиве (учитывается только --search и --limit)")
+    lst.set_defaults(func=cmd_list)
+
+    for name, status, text in (("done", STATUS_DONE, "отметить задачи выполненными"),
+                               ("reopen", STATUS_PENDING, "вернуть задачи в работу")):
+        sub = commands.add_parser(name, help=f"{text}; печатает число изменённых")
+        sub.add_argument("ids", type=int, nargs="+")
+        sub.set_defaults(func=cmd_set_status(status))
+
+    for name, text, empty in (("undo", "отменить последнее действие", "Нечего отменять"),
+                              ("redo", "повторить отменённое действие", "Нечего повторять")):
+        sub = commands.add_parser(name, help=f"{text}; печатает его название")
+        sub.set_defaults(func=cmd_history(name, empty))
+
+    export = commands.add_parser("export", help="выгрузить все задачи в CSV")
+    export.add_argument("path")
+    export.add_argument("--with-archive", action="store_true", help="добавить задачи из архива")
+    export.set_defaults(func=cmd_export)
+
+    imp = commands.add_parser("import", help="загрузить задачи из CSV; печатает число добавленных")
+    imp.add_argument("path")
+    imp.set_defaults(func=cmd_import)
+
+    maintain = commands.add_parser(
+        "maintain", help="перенести в архив давно выполненные задачи и обслужить базу; печатает число перенесённых")
+    maintain.add_argument("--days", type=int, default=ARCHIVE_AFTER_DAYS,
+                          help=f"выполненные больше N дней назад (по умолчанию {ARCHIVE_AFTER_DAYS})")
+    maintain.set_defaults(func=cmd_maintain)
+
+    snapshot = commands.add_parser("snapshot", help="снять снимок базы с архивом; печатает путь к нему")
+    # snapshots импортируется только командами снимков: он не нужен для запуска остальных
+    snapshot.add_argument("--keep", type=int,
+                          help="сколько последних снимков хранить (по умолчанию столько же, сколько в окне)")
+    snapshot.set_defaults(func=cmd_snapshot)
+    commands.add_parser("snapshots", help="снимки от новых к старым: время, размер, путь").set_defaults(
+        func=cmd_snapshots)
+    restore = commands.add_parser("restore", help="заменить базу и архив снимком (прежнее состояние тоже снимается)")
+    restore.add_argument("path")
+    restore.set_defaults(func=cmd_restore)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.profile:
+        enable_profiling()
+    db = TaskDatabase(args.db)
+    try:
+        args.func(db, args)
+    except BrokenPipeError:
+        # Вывод оборвали (например, | head) — это не ошибка; остаток буфера уходит в никуда
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+    except (OSError, ValueError) as e:
+        print(f"Ошибка: {e}", file=sys.stderr)
+        return 1
+    finally:
+        db.close()
+        if args.profile:
+            print(describe_commits(db.commit_stats), file=sys.stderr)
+            print("\n".join(tracer.summary_lines()), file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,98 @@
+import csv
+import itertools
+import os
+from datetime import date
+from database import STATUS_DONE, STATUS_PENDING
+
+CSV_HEADER = ["ID", "Заголовок", "Заметки", "Дедлайн", "Статус", "Категория"]
+CHUNK_SIZE = 5000
+IMPORT_CHUNK_SIZE = 50000
+
+
+class TransferCancelled(Exception):
+    pass
+
+
+def export_csv(db, file_path, progress=None, chunk_size=CHUNK_SIZE, include_archive=False):
+    """Пишет все задачи в CSV порциями, не держа их в памяти; возвращает число строк.
+
+    progress(done, total) вызывается после каждой порции; если он вернул False,
+    выгрузка прерывается, а недописанный файл удаляется. С include_archive
+    после основных задач выгружается архив.
+    """
+    total = db.count_tasks()
+    chunks = db.iter_tasks(chunk_size=chunk_size)
+    if include_archive:
+        total += db.count_archived()
+        chunks = itertools.chain(chunks, db.iter_archive(chunk_size=chunk_size))
+    done = 0
+    try:
+        with open(file_path, mode='w', newline='', encoding='utf-8-sig') as file:
+            writer = csv.writer(file, delimiter=';')
+            writer.writerow(CSV_HEADER)
+            for rows in chunks:
+                writer.writerows(rows)
+                done += len(rows)
+                if progress and progress(done, total) is False:
+                    raise TransferCancelled()
+    except TransferCancelled:
+        os.remove(file_path)
+        raise
+    return done
+
+
+def parse_row(record):
+    """Строка CSV -> (title, notes, deadline, status, category) или None, если строка некорректна"""
+    if len(record) < 6:
+        return None
+    _, title, notes, deadline, status, category = record[:6]
+    title = title.strip()
+    if not title:
+        return None
+    if not deadline:
+        deadline = None  # задача без срока выгружается пустой ячейкой
+    elif len(deadline) != 10:
+        return None
+    else:
+        try:
+            date.fromisoformat(deadline)
+        except ValueError:
+            return None
+    status = STATUS_DONE if status == STATUS_DONE else STATUS_PENDING
+    return title, notes, deadline, status, category or None
+
+
+def import_csv(db, file_path, progress=None, chunk_size=IMPORT_CHUNK_SIZE):
+    """Загружает задачи из CSV в формате export_csv; возвращает (добавлено, пропущено).
+
+    Строки вставляются пачками по chunk_size, каждая пачка — одной транзакцией.
+    Id из файла не используются: задачи получают новые id. progress(done, total)
+    получает прочитанные байты; если он вернул False, чтение прекращается,
+    уже записанные пачки остаются в базе.
+    """
+    total = os.path.getsize(file_path)
+    added = skipped = 0
+    with db.bulk_mode(), open(file_path, newline='', encoding='utf-8-sig') as file:
+        reader = csv.reader(file, delimiter=';')
+        if next(reader, None) != CSV_HEADER:
+            raise ValueError("Файл не похож на выгрузку задач")
+
+        batch = []
+        for record in reader:
+            row = parse_row(record)
+            if row is None:
+                skipped += 1
+                continue
+            batch.append(row)
+            if len(batch) >= chunk_size:
+                added += db.insert_many(batch)
+                db.flush()  # пачка фиксируется сразу, даже при групповом коммите
+                batch = []
+                if progress and progress(file.buffer.tell(), total) is False:
+                    return added, skipped
+
+        if batch:
+            added += db.insert_many(batch)
+    if progress:
+        progress(total, total)
+    return added, skipped
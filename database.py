@@ -1,103 +1,1042 @@
+import json
+import re
 import sqlite3
-from datetime import datetime
-from PyQt6.QtCore import QDate
+import time
+from contextlib import contextmanager
+from datetime import date, timedelta
+from profiling import tracer, timed
 
 STATUS_PENDING = "Не выполнено"
 STATUS_DONE = "Выполнено"
 STATUS_OVERDUE = "Просрочено"
 
+# Порядок групп в списке; просрочка вычисляется при чтении и в базе не хранится
+STATUS_RANK = {STATUS_PENDING: 0, STATUS_OVERDUE: 1, STATUS_DONE: 2}
+
 DEFAULT_CATEGORIES = ["Домашние дела", "Учеба", "Личные дела"]
 ADD_NEW_CAT_TEXT = "➕ Своя категория..."
 
+# Полнотекстовый индекс по названию и заметкам; триггеры держат его в актуальном состоянии
+FTS_SCHEMA = (
+    """CREATE VIRTUAL TABLE IF NOT EXISTS tasks_fts USING fts5(
+        title, notes, content='tasks', content_rowid='id', prefix='2 3', tokenize='unicode61')""",
+    """CREATE TRIGGER IF NOT EXISTS tasks_fts_ai AFTER INSERT ON tasks BEGIN
+        INSERT INTO tasks_fts (rowid, title, notes) VALUES (new.id, new.title, new.notes);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS tasks_fts_ad AFTER DELETE ON tasks BEGIN
+        INSERT INTO tasks_fts (tasks_fts, rowid, title, notes) VALUES ('delete', old.id, old.title, old.notes);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS tasks_fts_au AFTER UPDATE OF title, notes ON tasks BEGIN
+        INSERT INTO tasks_fts (tasks_fts, rowid, title, notes) VALUES ('delete', old.id, old.title, old.notes);
+        INSERT INTO tasks_fts (rowid, title, notes) VALUES (new.id, new.title, new.notes);
+    END""",
+)
+
+# Части списка в порядке вывода: (показываемый статус, хранимый статус, условие на дедлайн).
+# Каждая часть читается по индексу (status, deadline) уже отсортированной, без сортировки в памяти.
+# Пустой срок выделен в отдельные части, чтобы ключ страницы (срок, id) сравнивался внутри части без NULL.
+LIST_SEGMENTS = (
+    (STATUS_PENDING, STATUS_PENDING, "deadline IS NULL"),
+    (STATUS_PENDING, STATUS_PENDING, "deadline >= ?"),
+    (STATUS_OVERDUE, STATUS_PENDING, "deadline < ?"),
+    (STATUS_DONE, STATUS_DONE, "deadline IS NULL"),
+    (STATUS_DONE, STATUS_DONE, "deadline IS NOT NULL"),
+)
+
+# Архив — отдельный файл рядом с основной базой (tasks_v2_archive.sqlite), подключается как схема archive.
+# Категория хранится в нём именем, чтобы архив читался без основной базы.
+# Число задач в архиве держится счётчиком archive.counts, чтобы статистика не считала архив целиком;
+# для архива без счётчика (старая версия, снимок) он заводится один раз по count(*)
+ARCHIVE_SCHEMA = (
+    """CREATE TABLE IF NOT EXISTS archive.tasks (
+        id INTEGER PRIMARY KEY, title TEXT, notes TEXT, deadline TEXT, status TEXT, category TEXT, completed_at TEXT)""",
+    """CREATE VIRTUAL TABLE IF NOT EXISTS archive.tasks_fts USING fts5(
+        title, notes, prefix='2 3', tokenize='unicode61')""",
+    "CREATE TABLE IF NOT EXISTS archive.counts (name TEXT PRIMARY KEY, n INTEGER NOT NULL)",
+    """INSERT INTO archive.counts SELECT 'tasks', (SELECT count(*) FROM archive.tasks)
+        WHERE NOT EXISTS (SELECT 1 FROM archive.counts WHERE name = 'tasks')""",
+)
+ARCHIVE_AFTER_DAYS = 30
+ARCHIVE_BATCH_SIZE = 500
+VACUUM_PAGES = 2048
+
+# Подготовленные запросы sqlite3 кэширует по тексту. Запросы с переменным числом
+# параметров передают id одним JSON-массивом (json_each), чтобы текст не менялся
+# и не вытеснял из кэша остальные
+STATEMENT_CACHE_SIZE = 256
+
+PAGE_SIZE = 200
+NOTES_PREVIEW_CHARS = 40  # столько символов заметок несут строки списка (карточка показывает 35)
+SEARCH_RANK_LIMIT = 1000  # столько самых новых совпадений поиска сортируются по bm25
+CHANGES_LIMIT = 20000  # больше изменений за раз дешевле применить перечитыванием списка
+CHANGES_KEEP = 50000
+
+# Журнал отмены — кольцо из UNDO_SLOTS действий; действие, затронувшее больше
+# UNDO_MAX_ROWS задач, не запоминается и очищает журнал
+UNDO_SLOTS = 30
+UNDO_MAX_ROWS = 20000
+UNDO_COLUMNS = ("title", "notes", "deadline", "status", "category_id", "completed_at")
+
+CACHE_SIZE_KIB = 16384
+BULK_CACHE_SIZE_KIB = 262144
+
+CONNECTION_PRAGMAS = (
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    f"PRAGMA cache_size = -{CACHE_SIZE_KIB}",
+    "PRAGMA mmap_size = 268435456",  # 256 МБ
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA foreign_keys = ON",
+)
+
+
+def archive_name(db_name):
+    """Файл архива для файла базы: tasks_v2.sqlite -> tasks_v2_archive.sqlite"""
+    if db_name == ":memory:":
+        return db_name
+    return re.sub(r"(\.sqlite)?$", "_archive.sqlite", db_name, count=1)
+
+
+def describe_commits(stats):
+    """Строка о коммитах по TaskDatabase.commit_stats"""
+    if not stats["commits"]:
+        return "коммитов ещё не было"
+    return (f"коммитов {stats['commits']}, записей {stats['writes']}: последний {stats['last_ms']:.1f} мс, "
+            f"средний {stats['total_ms'] / stats['commits']:.1f} мс, макс {stats['max_ms']:.1f} мс")
+
+
+def today_str():
+    return date.today().isoformat()
+
+
+def effective_status(status, deadline, today):
+    """Статус для отображения: невыполненная задача с истёкшим сроком считается просроченной"""
+    if status != STATUS_DONE and deadline and deadline < today:
+        return STATUS_OVERDUE
+    return STATUS_DONE if status == STATUS_DONE else STATUS_PENDING
+
+
+def task_sort_key(row):
+    """Ключ сортировки строки (id, title, notes, deadline, status, category) как в get_tasks"""
+    return STATUS_RANK.get(row[4], 3), row[3] or "", row[0]
+
+
+def notes_preview(column):
+    """Выражение SQL для начала заметок без ведущих пробелов: списку целые заметки не нужны"""
+    return f"substr(ltrim({column}, ' ' || char(9, 10, 13)), 1, {NOTES_PREVIEW_CHARS})"
+
+
+def fts_query(text):
+    """Превращает строку поиска в запрос FTS5: все слова обязательны и ищутся по префиксу.
+
+    Однобуквенное слово ищется целиком: префиксный индекс (prefix='2 3') начинается
+    с двух букв, а префикс из одной буквы пришлось бы собирать из всего словаря.
+    """
+    words = re.findall(r"\w+", text)
+    return " ".join(f'"{word}"*' if len(word) > 1 else f'"{word}"' for word in words)
+
+
+def _migrate_base_schema(cursor):
+    cursor.execute('''CREATE TABLE IF NOT EXISTS tasks 
+        (id INTEGER PRIMARY KEY AUTOINCREMENT, title TEXT, notes TEXT, deadline TEXT, status TEXT)''')
+    columns = {row[1] for row in cursor.execute("PRAGMA table_info(tasks)")}
+    if "category" not in columns:
+        cursor.execute("ALTER TABLE tasks ADD COLUMN category TEXT")
+
+
+def _migrate_fts(cursor):
+    for statement in FTS_SCHEMA:
+        cursor.execute(statement)
+    cursor.execute("INSERT INTO tasks_fts (tasks_fts) VALUES ('rebuild')")
+
+
+def _migrate_stored_status(cursor):
+    # Раньше просрочка записывалась в базу; теперь храним только «выполнено»/«не выполнено»
+    cursor.execute("UPDATE tasks SET status = ? WHERE status IS NULL OR status != ?", (STATUS_PENDING, STATUS_DONE))
+
+
+def _migrate_list_indexes(cursor):
+    cursor.execute("CREATE INDEX idx_tasks_status_deadline ON tasks (status, deadline)")
+    cursor.execute("CREATE INDEX idx_tasks_category_status_deadline ON tasks (category, status, deadline)")
+    cursor.execute("ANALYZE")
+
+
+def _migrate_stat_counters(cursor):
+    # Счётчики задач по (категория, статус, дедлайн): их строк на порядки меньше, чем задач,
+    # а просрочку по ним можно посчитать на любую дату
+    cursor.execute("""CREATE TABLE task_counts (
+        category TEXT NOT NULL, status TEXT NOT NULL, deadline TEXT NOT NULL, n INTEGER NOT NULL,
+        PRIMARY KEY (category, status, deadline)) WITHOUT ROWID""")
+    cursor.execute("""CREATE TABLE daily_activity (
+        day TEXT PRIMARY KEY, created INTEGER NOT NULL DEFAULT 0, completed INTEGER NOT NULL DEFAULT 0)""")
+    cursor.execute("""INSERT INTO task_counts
+        SELECT IFNULL(category, ''), status, IFNULL(deadline, ''), count(*) FROM tasks GROUP BY 1, 2, 3""")
+    cursor.execute("""CREATE TRIGGER task_counts_ai AFTER INSERT ON tasks BEGIN
+        INSERT INTO task_counts VALUES (IFNULL(new.category, ''), new.status, IFNULL(new.deadline, ''), 1)
+            ON CONFLICT DO UPDATE SET n = n + 1;
+        INSERT INTO daily_activity (day, created) VALUES (date('now', 'localtime'), 1)
+            ON CONFLICT DO UPDATE SET created = created + 1;
+    END""")
+    cursor.execute("""CREATE TRIGGER task_counts_ad AFTER DELETE ON tasks BEGIN
+        UPDATE task_counts SET n = n - 1
+            WHERE category = IFNULL(old.category, '') AND status = old.status AND deadline = IFNULL(old.deadline, '');
+        DELETE FROM task_counts WHERE n <= 0;
+    END""")
+    cursor.execute(f"""CREATE TRIGGER task_counts_au AFTER UPDATE OF status, category, deadline ON tasks BEGIN
+        UPDATE task_counts SET n = n - 1
+            WHERE category = IFNULL(old.category, '') AND status = old.status AND deadline = IFNULL(old.deadline, '');
+        DELETE FROM task_counts WHERE n <= 0;
+        INSERT INTO task_counts VALUES (IFNULL(new.category, ''), new.status, IFNULL(new.deadline, ''), 1)
+            ON CONFLICT DO UPDATE SET n = n + 1;
+        INSERT INTO daily_activity (day, completed)
+            SELECT date('now', 'localtime'), 1 WHERE new.status = '{STATUS_DONE}' AND old.status != '{STATUS_DONE}'
+            ON CONFLICT DO UPDATE SET completed = completed + 1;
+    END""")
+
+
+def _migrate_categories(cursor):
+    # Категории переезжают в свою таблицу; задачи ссылаются на неё по id
+    cursor.execute("CREATE TABLE categories (id INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE)")
+    cursor.executemany("INSERT INTO categories (name) VALUES (?)", ((name,) for name in DEFAULT_CATEGORIES))
+    cursor.execute("""INSERT OR IGNORE INTO categories (name)
+        SELECT DISTINCT category FROM tasks WHERE category IS NOT NULL AND category != ''""")
+    cursor.execute("ALTER TABLE tasks ADD COLUMN category_id INTEGER REFERENCES categories (id)")
+    cursor.execute("UPDATE tasks SET category_id = (SELECT id FROM categories WHERE name = tasks.category)")
+
+    # Старый столбец нельзя удалить, пока на него ссылаются индекс и триггеры счётчиков
+    cursor.execute("DROP INDEX idx_tasks_category_status_deadline")
+    for trigger in ("task_counts_ai", "task_counts_ad", "task_counts_au"):
+        cursor.execute(f"DROP TRIGGER {trigger}")
+    cursor.execute("ALTER TABLE tasks DROP COLUMN category")
+    cursor.execute("CREATE INDEX idx_tasks_category_status_deadline ON tasks (category_id, status, deadline)")
+
+    cursor.execute("DROP TABLE task_counts")
+    cursor.execute("""CREATE TABLE task_counts (
+        category_id INTEGER NOT NULL, status TEXT NOT NULL, deadline TEXT NOT NULL, n INTEGER NOT NULL,
+        PRIMARY KEY (category_id, status, deadline)) WITHOUT ROWID""")
+    cursor.execute("""INSERT INTO task_counts
+        SELECT IFNULL(category_id, 0), status, IFNULL(deadline, ''), count(*) FROM tasks GROUP BY 1, 2, 3""")
+    cursor.execute("""CREATE TRIGGER task_counts_ai AFTER INSERT ON tasks BEGIN
+        INSERT INTO task_counts VALUES (IFNULL(new.category_id, 0), new.status, IFNULL(new.deadline, ''), 1)
+            ON CONFLICT DO UPDATE SET n = n + 1;
+        INSERT INTO daily_activity (day, created) VALUES (date('now', 'localtime'), 1)
+            ON CONFLICT DO UPDATE SET created = created + 1;
+    END""")
+    cursor.execute("""CREATE TRIGGER task_counts_ad AFTER DELETE ON tasks BEGIN
+        UPDATE task_counts SET n = n - 1
+            WHERE category_id = IFNULL(old.category_id, 0) AND status = old.status AND deadline = IFNULL(old.deadline, '');
+        DELETE FROM task_counts WHERE n <= 0;
+    END""")
+    cursor.execute(f"""CREATE TRIGGER task_counts_au AFTER UPDATE OF status, category_id, deadline ON tasks BEGIN
+        UPDATE task_counts SET n = n - 1
+            WHERE category_id = IFNULL(old.category_id, 0) AND status = old.status AND deadline = IFNULL(old.deadline, '');
+        DELETE FROM task_counts WHERE n <= 0;
+        INSERT INTO task_counts VALUES (IFNULL(new.category_id, 0), new.status, IFNULL(new.deadline, ''), 1)
+            ON CONFLICT DO UPDATE SET n = n + 1;
+        INSERT INTO daily_activity (day, completed)
+            SELECT date('now', 'localtime'), 1 WHERE new.status = '{STATUS_DONE}' AND old.status != '{STATUS_DONE}'
+            ON CONFLICT DO UPDATE SET completed = completed + 1;
+    END""")
+    cursor.execute("ANALYZE")
+
+
+def _migrate_change_feed(cursor):
+    # Журнал изменений для других окон и процессов: каждая запись о задаче получает следующий номер.
+    # task_id NULL — изменено сразу много задач (массовая загрузка), список нужно перечитать
+    cursor.execute("CREATE TABLE task_changes (seq INTEGER PRIMARY KEY AUTOINCREMENT, task_id INTEGER)")
+    cursor.execute("""CREATE TRIGGER task_changes_ai AFTER INSERT ON tasks BEGIN
+        INSERT INTO task_changes (task_id) VALUES (new.id);
+    END""")
+    cursor.execute("""CREATE TRIGGER task_changes_au AFTER UPDATE ON tasks BEGIN
+        INSERT INTO task_changes (task_id) VALUES (new.id);
+    END""")
+    cursor.execute("""CREATE TRIGGER task_changes_ad AFTER DELETE ON tasks BEGIN
+        INSERT INTO task_changes (task_id) VALUES (old.id);
+    END""")
+
+
+def _migrate_completed_at(cursor):
+    # Дата выполнения нужна, чтобы переносить в архив давно выполненные задачи.
+    # Для уже выполненных задач она неизвестна, отсчёт для них начинается с обновления
+    cursor.execute("ALTER TABLE tasks ADD COLUMN completed_at TEXT")
+    cursor.execute("UPDATE tasks SET completed_at = date('now', 'localtime') WHERE status = ?", (STATUS_DONE,))
+    cursor.execute("CREATE INDEX idx_tasks_completed_at ON tasks (completed_at) WHERE completed_at IS NOT NULL")
+    cursor.execute(f"""CREATE TRIGGER tasks_completed_au AFTER UPDATE OF status ON tasks
+        WHEN (new.status = '{STATUS_DONE}') != (old.status = '{STATUS_DONE}') BEGIN
+        UPDATE tasks SET completed_at = CASE WHEN new.status = '{STATUS_DONE}' THEN date('now', 'localtime') END
+            WHERE id = new.id;
+    END""")
+
+
+def _migrate_undo_log(cursor):
+    # Действие хранит только изменившиеся столбцы (columns, JSON-список) и значения
+    # до и после по id: {"id": [значения] или null, если задачи не было / не стало}
+    cursor.execute("""CREATE TABLE undo_log (
+        slot INTEGER PRIMARY KEY, seq INTEGER NOT NULL, label TEXT NOT NULL, columns TEXT NOT NULL,
+        before TEXT NOT NULL, after TEXT NOT NULL, undone INTEGER NOT NULL DEFAULT 0)""")
+
+
+def _migrate_keyed_counter_cleanup(cursor):
+    # Обнулившийся счётчик удаляется по своему ключу: DELETE по условию n <= 0
+    # просматривал всю task_counts на каждую изменённую задачу
+    keys = "category_id = IFNULL(old.category_id, 0) AND status = old.status AND deadline = IFNULL(old.deadline, '')"
+    for trigger in ("task_counts_ad", "task_counts_au"):
+        cursor.execute(f"DROP TRIGGER {trigger}")
+    cursor.execute(f"""CREATE TRIGGER task_counts_ad AFTER DELETE ON tasks BEGIN
+        UPDATE task_counts SET n = n - 1 WHERE {keys};
+        DELETE FROM task_counts WHERE {keys} AND n <= 0;
+    END""")
+    cursor.execute(f"""CREATE TRIGGER task_counts_au AFTER UPDATE OF status, category_id, deadline ON tasks BEGIN
+        UPDATE task_counts SET n = n - 1 WHERE {keys};
+        DELETE FROM task_counts WHERE {keys} AND n <= 0;
+        INSERT INTO task_counts VALUES (IFNULL(new.category_id, 0), new.status, IFNULL(new.deadline, ''), 1)
+            ON CONFLICT DO UPDATE SET n = n + 1;
+        INSERT INTO daily_activity (day, completed)
+            SELECT date('now', 'localtime'), 1 WHERE new.status = '{STATUS_DONE}' AND old.status != '{STATUS_DONE}'
+            ON CONFLICT DO UPDATE SET completed = completed + 1;
+    END""")
+
+
+# Миграции по порядку: номер версии схемы (PRAGMA user_version) — индекс миграции + 1
+MIGRATIONS = (
+    _migrate_base_schema,
+    _migrate_fts,
+    _migrate_stored_status,
+    _migrate_list_indexes,
+    _migrate_stat_counters,
+    _migrate_categories,
+    _migrate_change_feed,
+    _migrate_completed_at,
+    _migrate_undo_log,
+    _migrate_keyed_counter_cleanup,
+)
+
+# Построчные триггеры на вставку и их замена для массовой загрузки: запросы на всю пачку (id > ?)
+BULK_INSERT_TRIGGERS = {
+    "tasks_fts_ai": (
+        "INSERT INTO tasks_fts (rowid, title, notes) SELECT id, title, notes FROM tasks WHERE id > ?",
+    ),
+    "task_counts_ai": (
+        """INSERT INTO task_counts
+            SELECT IFNULL(category_id, 0), status, IFNULL(deadline, ''), count(*) FROM tasks WHERE id > ? GROUP BY 1, 2, 3
+            ON CONFLICT DO UPDATE SET n = n + excluded.n""",
+        """INSERT INTO daily_activity (day, created) SELECT date('now', 'localtime'), count(*) FROM tasks WHERE id > ?
+            ON CONFLICT DO UPDATE SET created = created + excluded.created""",
+    ),
+    "task_changes_ai": (
+        "INSERT INTO task_changes (task_id) SELECT NULL FROM tasks WHERE id > ? LIMIT 1",
+    ),
+}
+
 
 class TaskDatabase:
     def __init__(self, db_name="tasks_v2.sqlite"):  #
-        self.conn = sqlite3.connect(db_name)
+        self.db_name = db_name
+        self.conn = sqlite3.connect(db_name, cached_statements=STATEMENT_CACHE_SIZE)
         self.cursor = self.conn.cursor()
+        if tracer.enabled:
+            tracer.attach(self.conn)
+        for pragma in CONNECTION_PRAGMAS:
+            self.cursor.execute(pragma)
+        self.cursor.execute("ATTACH DATABASE ? AS archive", (archive_name(db_name),))
         self.init_db()
+        self.load_categories()
+        self.data_version = None
 
-    def init_db(self):
-        self.cursor.execute('''CREATE TABLE IF NOT EXISTS tasks 
-            (id INTEGER PRIMARY KEY AUTOINCREMENT, title TEXT, notes TEXT, deadline TEXT, status TEXT)''')
+        self.group_commit_ms = 0
+        self.pending_writes = 0  # записей с последнего коммита
+        self.commit_stats = {"commits": 0, "writes": 0, "last_ms": 0.0, "max_ms": 0.0, "total_ms": 0.0}
+        self._depth = 0
+        self._pending_since = None
+
+    @contextmanager
+    def transaction(self):
+        """Единица работы: изменения внутри блока фиксируются вместе или не фиксируются вовсе.
+
+        Все пишущие методы работают через неё, поэтому несколько вызовов внутри одного
+        блока дают один коммит. Вложенный блок — точка сохранения: его ошибка откатывает
+        только его. При групповом коммите (set_group_commit) транзакция после блока
+        остаётся открытой до flush() или до конца блока, завершившегося после окна.
+        """
+        if self.conn.in_transaction:
+            savepoint = f"unit_{self._depth}"
+            self.conn.execute(f"SAVEPOINT {savepoint}")
+            self._depth += 1
+            try:
+                yield
+            except BaseException:
+                self.conn.execute(f"ROLLBACK TO {savepoint}")
+                self.load_categories()  # в кэше могли остаться откатившиеся категории
+                raise
+            finally:
+                self._depth -= 1
+                self.conn.execute(f"RELEASE {savepoint}")
+        else:
+            self.conn.execute("BEGIN IMMEDIATE")
+            self._depth += 1
+            try:
+                yield
+            except BaseException:
+                self.conn.rollback()
+                self.load_categories()
+                raise
+            finally:
+                self._depth -= 1
+
+        if self._depth == 0:
+            self.pending_writes += 1
+            # Окно группового коммита проверяется и здесь, а не только в потоке базы между
+            # вызовами: иначе долгий вызов (импорт пачками) копил бы все пачки в одной транзакции
+            if not self.group_commit_ms or self.flush_due() == 0:
+                self.flush()
+            elif self._pending_since is None:
+                self._pending_since = time.perf_counter()
+
+    def set_group_commit(self, window_ms):
+        """Групповой коммит: записи, пришедшие в течение window_ms, фиксируются одним коммитом.
+        Фиксирует их flush(); когда его пора вызвать, подсказывает flush_due(). 0 — выключен.
+
+        Пока он включён, коммит ждёт fsync (synchronous = FULL): одна синхронизация
+        делится на все записи окна. Без него остаётся NORMAL — в режиме WAL коммит
+        тогда переживает падение приложения, но не отключение питания."""
+        self.flush()
+        self.group_commit_ms = window_ms
+        self.cursor.execute(f"PRAGMA synchronous = {'FULL' if window_ms else 'NORMAL'}")
+
+    def flush_due(self):
+        """Через сколько секунд пора вызвать flush(); None — фиксировать нечего"""
+        if self._pending_since is None:
+            return None
+        return max(0.0, self._pending_since + self.group_commit_ms / 1000 - time.perf_counter())
+
+    @timed
+    def flush(self):
+        """Фиксирует накопленные записи; возвращает время коммита в мс (0 — фиксировать было нечего).
+        После возврата записи переживут падение приложения, а при групповом коммите
+        (synchronous = FULL) и отключение питания."""
+        if self._depth or not self.conn.in_transaction:
+            return 0.0
+        start = time.perf_counter()
         try:
-            self.cursor.execute("ALTER TABLE tasks ADD COLUMN category TEXT")
-        except sqlite3.OperationalError:
-            pass
-        self.conn.commit()
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            self.load_categories()
+            raise
+        finally:
+            self._pending_since = None
+            writes, self.pending_writes = self.pending_writes, 0
+
+        elapsed = (time.perf_counter() - start) * 1000
+        stats = self.commit_stats
+        stats["commits"] += 1
+        stats["writes"] += writes
+        stats["last_ms"] = elapsed
+        stats["max_ms"] = max(stats["max_ms"], elapsed)
+        stats["total_ms"] += elapsed
+        return elapsed
+
+    def close(self):
+        self.flush()
+        self.conn.close()
 
-    def update_overdue_statuses(self):
-        today = QDate.currentDate().toString("yyyy-MM-dd")
-        self.cursor.execute("UPDATE tasks SET status = ? WHERE status != ? AND deadline < ?",
-                            (STATUS_OVERDUE, STATUS_DONE, today))
+    @timed
+    def init_db(self):
+        version = self.cursor.execute("PRAGMA user_version").fetchone()[0]
+        for number, migration in enumerate(MIGRATIONS[version:], start=version + 1):
+            # Каждая миграция вместе с номером версии применяется одной транзакцией
+            self.cursor.execute("BEGIN")
+            try:
+                migration(self.cursor)
+                self.cursor.execute(f"PRAGMA user_version = {number}")
+                self.conn.commit()
+            except Exception:
+                self.conn.rollback()
+                raise
+        for statement in ARCHIVE_SCHEMA:
+            self.cursor.execute(statement)
         self.conn.commit()
 
-    def get_tasks(self, category_filter=None, status_filter=None, search_text=None):
-        self.update_overdue_statuses()
+    def _list_queries(self, category_filter=None, status_filter=None, search_text=None, after=None, preview=False):
+        """Запросы, из которых складывается список задач, в порядке вывода.
 
-        query = "SELECT id, title, notes, deadline, status, category FROM tasks"
-        params = []
-        conditions = []
+        after — ключ последней уже полученной строки (см. get_task_page): запросы
+        продолжают список с места сразу за ней. Строки поиска несут седьмым
+        столбцом оценку bm25, она нужна для ключа. С preview вместо заметок
+        отдаётся их начало (notes_preview).
+
+        Поиск сортирует по bm25 только SEARCH_RANK_LIMIT самых новых совпадений:
+        оценка всех совпадений с сортировкой стоит сотни миллисекунд на каждую
+        страницу. Более старые совпадения идут следом от новых к старым, с оценкой 0
+        (bm25 всегда отрицательна), по ним страница ищется по id без сортировки.
+        """
+        today = today_str()
+        notes = notes_preview("tasks.notes") if preview else "tasks.notes"
+        filters = []
+        filter_params = []
 
         if category_filter and category_filter != "Все категории":
-            conditions.append("category = ?")
-            params.append(category_filter)
+            filters.append("category_id = ?")
+            filter_params.append(self.category_ids.get(category_filter))
 
-        if status_filter and status_filter != "Все статусы":
-            conditions.append("status = ?")
-            params.append(status_filter)
+        match = fts_query(search_text) if search_text else ""
+        if match:
+            conditions = ["tasks_fts MATCH ?"] + filters
+            params = [match] + filter_params
+            if status_filter == STATUS_DONE:
+                conditions.append("status = ?")
+                params.append(STATUS_DONE)
+            elif status_filter == STATUS_PENDING:
+                conditions.append("status = ? AND (deadline IS NULL OR deadline >= ?)")
+                params += [STATUS_PENDING, today]
+            elif status_filter == STATUS_OVERDUE:
+                conditions.append("status = ? AND deadline < ?")
+                params += [STATUS_PENDING, today]
 
-        if search_text:
-            conditions.append("title LIKE ?")
-            params.append(f"%{search_text}%")
+            # Граница оцениваемых совпадений: id SEARCH_RANK_LIMIT-го с конца (0, если их меньше).
+            # CROSS JOIN и NOT INDEXED закрепляют план: сначала совпадения FTS, потом задачи
+            # по id. Иначе на маленькой таблице статистика ANALYZE уводит его в обход индекса
+            where = " AND ".join(conditions)
+            bound = f"""IFNULL((SELECT tasks_fts.rowid FROM tasks_fts CROSS JOIN tasks NOT INDEXED ON tasks.id = tasks_fts.rowid
+                WHERE {where} ORDER BY tasks_fts.rowid DESC LIMIT 1 OFFSET {SEARCH_RANK_LIMIT - 1}), 0)"""
+            select = f"""SELECT tasks.id AS id, tasks.title, {notes}, deadline,
+                    CASE WHEN status != ? AND deadline < ? THEN ? ELSE status END, categories.name, {{score}} AS score
+                FROM tasks_fts CROSS JOIN tasks NOT INDEXED ON tasks.id = tasks_fts.rowid
+                    LEFT JOIN categories ON categories.id = tasks.category_id
+                WHERE {where} AND tasks_fts.rowid {{range}} {bound}"""
+            head = [STATUS_DONE, today, STATUS_OVERDUE] + params
+            params = head + params  # условия повторяются в подзапросе границы
 
-        if conditions:
-            query += " WHERE " + " AND ".join(conditions)
+            queries = []
+            if not after or after[0] < 0:
+                # Совпадения в названии весят больше, чем в заметках
+                query = select.format(score="bm25(tasks_fts, 10.0, 1.0)", range=">=")
+                ranked = params
+                if after:
+                    query = f"SELECT * FROM ({query}) WHERE (score, id) > (?, ?)"
+                    ranked = params + list(after)
+                queries.append((query + " ORDER BY score, id", ranked))
+            query = select.format(score="0.0", range="<")
+            rest = params
+            if after and after[0] >= 0:
+                query += " AND tasks_fts.rowid < ?"
+                rest = params + [after[1]]
+            queries.append((query + " ORDER BY tasks_fts.rowid DESC", rest))
+            return queries
 
-        query += f""" ORDER BY CASE status 
-            WHEN '{STATUS_PENDING}' THEN 0 
-            WHEN '{STATUS_OVERDUE}' THEN 1 
-            WHEN '{STATUS_DONE}' THEN 2 
-            ELSE 3 END, deadline ASC"""
+        # Части списка рассчитаны на свой индекс; INDEXED BY не даёт статистике
+        # маленькой таблицы выбрать вместо него полный просмотр
+        index = "idx_tasks_category_status_deadline" if filters else "idx_tasks_status_deadline"
+        queries = []
+        for shown_status, stored_status, deadline_condition in LIST_SEGMENTS:
+            if status_filter in STATUS_RANK and status_filter != shown_status:
+                continue
+            conditions = ["status = ?"] + filters
+            params = [shown_status, stored_status] + filter_params
+            if deadline_condition:
+                conditions.append(deadline_condition)
+                params += [today] * deadline_condition.count("?")
 
-        self.cursor.execute(query, params)
-        return self.cursor.fetchall()
+            if after:
+                # Ключ (ранг статуса, срок или "", id), как у task_sort_key
+                rank, deadline, tid = after
+                if STATUS_RANK[shown_status] < rank:
+                    continue
+                if STATUS_RANK[shown_status] == rank:
+                    if deadline_condition == "deadline IS NULL":
+                        if deadline:
+                            continue
+                        conditions.append("tasks.id > ?")
+                        params.append(tid)
+                    elif deadline:
+                        conditions.append("(deadline, tasks.id) > (?, ?)")
+                        params += [deadline, tid]
+
+            query = f"""SELECT tasks.id, title, {notes}, deadline, ?, categories.name
+                FROM tasks INDEXED BY {index} LEFT JOIN categories ON categories.id = tasks.category_id
+                WHERE {" AND ".join(conditions)} ORDER BY deadline, tasks.id"""
+            queries.append((query, params))
+        return queries
+
+    @timed
+    def get_tasks(self, category_filter=None, status_filter=None, search_text=None):
+        rows = []
+        for chunk in self.iter_tasks(category_filter, status_filter, search_text):
+            rows += chunk
+        return rows
+
+    def iter_tasks(self, category_filter=None, status_filter=None, search_text=None, chunk_size=1000, preview=False):
+        """Отдаёт список задач порциями по chunk_size строк, не держа в памяти весь результат"""
+        cursor = self.conn.cursor()
+        for query, params in self._list_queries(category_filter, status_filter, search_text, preview=preview):
+            cursor.execute(query, params)
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                yield [row[:6] for row in rows]
+
+    @timed
+    def get_task(self, tid):
+        """Задача целиком, с полными заметками, или None, если её уже нет"""
+        self.cursor.execute("""SELECT tasks.id, title, notes, deadline, status, categories.name
+            FROM tasks LEFT JOIN categories ON categories.id = tasks.category_id WHERE tasks.id = ?""", (tid,))
+        row = self.cursor.fetchone()
+        if row is None:
+            return None
+        tid, title, notes, deadline, status, category = row
+        return tid, title, notes, deadline, effective_status(status, deadline, today_str()), category
+
+    @timed
+    def get_task_page(self, category_filter=None, status_filter=None, search_text=None, after=None, limit=PAGE_SIZE,
+                      preview=False):
+        """Следующие limit строк списка после ключа after (None — с начала).
+
+        Возвращает (строки, ключ последней строки); ключ None, если строк больше нет.
+        Каждый запрос идёт по индексу от ключа, поэтому стоимость страницы
+        не зависит от её номера.
+        """
+        rows = []
+        last = None
+        for query, params in self._list_queries(category_filter, status_filter, search_text, after, preview):
+            self.cursor.execute(f"{query} LIMIT ?", params + [limit - len(rows)])
+            page = self.cursor.fetchall()
+            if page:
+                last = page[-1]
+                rows += [row[:6] for row in page]
+            if len(rows) >= limit:
+                break
+
+        if len(rows) < limit:
+            return rows, None
+        return rows, ((last[6], last[0]) if len(last) > 6 else task_sort_key(last))
+
+    def full_scan_list_queries(self):
+        """Проверка планов: возвращает запросы списка (при всех сочетаниях фильтров,
+        с начала и с ключа страницы), которые просматривают таблицу tasks или её индекс
+        целиком. Планы закреплены (INDEXED BY, CROSS JOIN), поэтому список пуст при
+        любом размере базы; bench.py проверяет это на каждой синтетической базе."""
+        offenders = []
+        for category in (None, DEFAULT_CATEGORIES[0]):
+            for status in (None, STATUS_PENDING, STATUS_OVERDUE, STATUS_DONE):
+                for search, after in ((None, None), (None, (0, "", 1)), (None, (1, "2000-01-01", 1)),
+                                      ("задача", None), ("задача", (-1.0, 1)), ("задача", (0.0, 1))):
+                    for query, params in self._list_queries(category, status, search, after):
+                        self.cursor.execute("EXPLAIN QUERY PLAN " + query, params)
+                        plan = [row[3] for row in self.cursor.fetchall()]
+                        if any(re.match(r"SCAN tasks\b", step) for step in plan):
+                            offenders.append((query, plan))
+        return offenders
+
+    def load_categories(self):
+        """Читает таблицу категорий в кэш: имя -> id и id -> имя"""
+        self.cursor.execute("SELECT name, id FROM categories")
+        self.category_ids = dict(self.cursor.fetchall())
+        self.category_names = {cid: name for name, cid in self.category_ids.items()}
+
+    def category_id(self, name):
+        """id категории по имени; новая категория заводится в таблице. Пустое имя — без категории."""
+        if not name:
+            return None
+        cid = self.category_ids.get(name)
+        if cid is None:
+            # Категорию мог уже завести другой процесс, тогда берём её id
+            self.cursor.execute("INSERT INTO categories (name) VALUES (?) ON CONFLICT (name) DO NOTHING", (name,))
+            cid = self.cursor.execute("SELECT id FROM categories WHERE name = ?", (name,)).fetchone()[0]
+            self.category_ids[name] = cid
+            self.category_names[cid] = name
+        return cid
 
+    # Отмена действий: пишущие методы запоминают значения затронутых столбцов до и после
+
+    def _snapshot(self, ids, columns):
+        """{id: [значения columns]} для тех задач из ids, которые есть в базе"""
+        self.cursor.execute(f"SELECT id, {', '.join(columns)} FROM tasks WHERE id IN (SELECT value FROM json_each(?))",
+                            (json.dumps(ids),))
+        return {row[0]: list(row[1:]) for row in self.cursor.fetchall()}
+
+    @contextmanager
+    def _undoable(self, label, ids=(), columns=UNDO_COLUMNS, overflow=False):
+        """Транзакция, изменения которой можно отменить. Тело может дописать в список
+        id (его отдаёт with) задачи, которые оно вставило. overflow — действие заведомо
+        больше UNDO_MAX_ROWS задач, и его id собирать не нужно."""
+        ids = list(ids)
+        overflow = overflow or len(ids) > UNDO_MAX_ROWS
+        with self.transaction():
+            before = None if overflow else self._snapshot(ids, columns)
+            yield ids
+            if overflow or len(ids) > UNDO_MAX_ROWS:
+                # Такое действие в журнал не влезает, а более ранние без него применять уже нельзя
+                self.cursor.execute("DELETE FROM undo_log")
+                return
+            self._push_undo(label, columns, before, self._snapshot(ids, columns))
+
+    def _push_undo(self, label, columns, before, after):
+        # В записи остаются только задачи, которые изменились, и столбцы, которые у них изменились
+        changed = set()
+        rows = []
+        # По возрастанию id: при отмене FTS5 получает rowid по порядку, иначе он
+        # сбрасывает сегмент индекса почти на каждую вставленную обратно задачу
+        for tid in sorted(before.keys() | after.keys()):
+            old, new = before.get(tid), after.get(tid)
+            if old is None or new is None:
+                changed.update(range(len(columns)))
+            elif old != new:
+                changed.update(i for i, (a, b) in enumerate(zip(old, new)) if a != b)
+            else:
+                continue
+            rows.append((tid, old, new))
+        if not rows:
+            return
+
+        keep = sorted(changed)
+        pick = lambda values: None if values is None else [values[i] for i in keep]
+        self.cursor.execute("DELETE FROM undo_log WHERE undone = 1")  # после нового действия повторять нечего
+        seq = (self.cursor.execute("SELECT max(seq) FROM undo_log").fetchone()[0] or 0) + 1
+        self.cursor.execute(
+            "INSERT OR REPLACE INTO undo_log (slot, seq, label, columns, before, after) VALUES (?, ?, ?, ?, ?, ?)",
+            (seq % UNDO_SLOTS, seq, label, json.dumps([columns[i] for i in keep]),
+             json.dumps({tid: pick(old) for tid, old, _ in rows}, ensure_ascii=False),
+             json.dumps({tid: pick(new) for tid, _, new in rows}, ensure_ascii=False)))
+
+    def _apply_delta(self, columns, values):
+        """Приводит задачи к значениям из записи журнала (values: {id: [значения] или null})
+        запросами на всю пачку сразу"""
+        removed = json.dumps([int(tid) for tid, row in values.items() if row is None])
+        rows = json.dumps({tid: row for tid, row in values.items() if row is not None}, ensure_ascii=False)
+        fields = [f"json_extract(d.value, '$[{i}]')" for i in range(len(columns))]
+        self.cursor.execute("DELETE FROM tasks WHERE id IN (SELECT value FROM json_each(?))", (removed,))
+        if set(columns) == set(UNDO_COLUMNS):
+            # Полные строки: удалённые задачи возвращаются под прежними id
+            self.cursor.execute(f"""INSERT INTO tasks (id, {', '.join(columns)})
+                SELECT CAST(d.key AS INTEGER), {', '.join(fields)} FROM json_each(?) AS d
+                WHERE true ORDER BY CAST(d.key AS INTEGER)
+                ON CONFLICT (id) DO UPDATE SET {', '.join(f'{c} = excluded.{c}' for c in columns)}""", (rows,))
+        else:
+            self.cursor.execute(f"""UPDATE tasks SET {', '.join(f'{c} = {f}' for c, f in zip(columns, fields))}
+                FROM json_each(?) AS d WHERE tasks.id = CAST(d.key AS INTEGER)""", (rows,))
+        if "completed_at" in columns:
+            # Триггер смены статуса ставит сегодняшнюю дату выполнения; возвращаем прежнюю
+            self.cursor.execute(f"""UPDATE tasks SET completed_at = {fields[columns.index("completed_at")]}
+                FROM json_each(?) AS d WHERE tasks.id = CAST(d.key AS INTEGER)""", (rows,))
+
+    def _step_history(self, undo):
+        undone, order, side = (0, "DESC", "before") if undo else (1, "ASC", "after")
+        with self.transaction():
+            self.cursor.execute(f"""SELECT slot, label, columns, {side} FROM undo_log
+                WHERE undone = ? ORDER BY seq {order} LIMIT 1""", (undone,))
+            entry = self.cursor.fetchone()
+            if entry is None:
+                return None
+            slot, label, columns, values = entry
+            # Отмена и повтор — не новая работа: триггеры счётчиков засчитали бы
+            # возвращённые задачи созданными, а смену статуса — выполнением, поэтому
+            # сегодняшняя строка daily_activity возвращается к прежним значениям
+            self.cursor.execute("SELECT day, created, completed FROM daily_activity WHERE day >= date('now', 'localtime')")
+            activity = self.cursor.fetchall()
+            self._apply_delta(json.loads(columns), json.loads(values))
+            self.cursor.execute("DELETE FROM daily_activity WHERE day >= date('now', 'localtime')")
+            self.cursor.executemany("INSERT INTO daily_activity (day, created, completed) VALUES (?, ?, ?)", activity)
+            self.cursor.execute("UPDATE undo_log SET undone = ? WHERE slot = ?", (1 - undone, slot))
+        return label
+
+    @timed
+    def undo(self):
+        """Отменяет последнее действие одной транзакцией; возвращает его название или None"""
+        return self._step_history(undo=True)
+
+    @timed
+    def redo(self):
+        """Повторяет последнее отменённое действие; возвращает его название или None"""
+        return self._step_history(undo=False)
+
+    @timed
     def add_task(self, title, notes, deadline, category):
-        # Проверяем статус при создании
-        status = STATUS_OVERDUE if deadline < QDate.currentDate().toString("yyyy-MM-dd") else STATUS_PENDING
-        self.cursor.execute("INSERT INTO tasks (title, notes, deadline, status, category) VALUES (?, ?, ?, ?, ?)",
-                            (title, notes, deadline, status, category))
-        self.conn.commit()
+        """Возвращает id новой задачи"""
+        with self._undoable("Новая задача") as ids:
+            self.cursor.execute("INSERT INTO tasks (title, notes, deadline, status, category_id) VALUES (?, ?, ?, ?, ?)",
+                                (title, notes, deadline, STATUS_PENDING, self.category_id(category)))
+            ids.append(self.cursor.lastrowid)
+        return ids[0]
 
+    @timed
     def update_task(self, tid, title, notes, deadline, status, category):
         if status != STATUS_DONE:
-            status = STATUS_OVERDUE if deadline < QDate.currentDate().toString("yyyy-MM-dd") else STATUS_PENDING
+            status = STATUS_PENDING
 
-        self.cursor.execute("UPDATE tasks SET title=?, notes=?, deadline=?, status=?, category=? WHERE id=?",
-                            (title, notes, deadline, status, category, tid))
-        self.conn.commit()
+        with self._undoable("Изменение задачи", [tid]):
+            self.cursor.execute("UPDATE tasks SET title=?, notes=?, deadline=?, status=?, category_id=? WHERE id=?",
+                                (title, notes, deadline, status, self.category_id(category), tid))
 
+    @timed
     def update_status(self, tid, new_status):
-        self.cursor.execute("UPDATE tasks SET status = ? WHERE id = ?", (new_status, tid))
-        self.conn.commit()
+        self.set_status_many([tid], new_status)
 
+    @timed
     def delete_task(self, tid):
-        self.cursor.execute("DELETE FROM tasks WHERE id = ?", (tid,))
-        self.conn.commit()
+        self.delete_many([tid])
+
+    # Массовые операции: один запрос на весь список id (json_each) в одной транзакции.
+    # executemany с построчными запросами заметно медленнее: FTS5 сбрасывает накопленные
+    # изменения индекса в конце каждого запроса, запустившего триггер
+
+    def _execute_many(self, label, columns, ids, query, params=()):
+        with self._undoable(label, ids, columns) as ids:
+            self.cursor.execute(query, (*params, json.dumps(ids)))
+            return self.cursor.rowcount
 
+    @timed
+    def set_status_many(self, ids, new_status):
+        if new_status != STATUS_DONE:
+            new_status = STATUS_PENDING
+        return self._execute_many("Смена статуса", ("status", "completed_at"), ids,
+                                  "UPDATE tasks SET status = ? WHERE id IN (SELECT value FROM json_each(?))",
+                                  (new_status,))
+
+    @timed
+    def toggle_status_many(self, ids):
+        """Выполненные задачи возвращает в работу, остальные отмечает выполненными"""
+        return self._execute_many("Смена статуса", ("status", "completed_at"), ids,
+                                  """UPDATE tasks SET status = CASE WHEN status = ? THEN ? ELSE ? END
+                                  WHERE id IN (SELECT value FROM json_each(?))""",
+                                  (STATUS_DONE, STATUS_PENDING, STATUS_DONE))
+
+    @timed
+    def insert_many(self, rows):
+        """rows: (title, notes, deadline, status, category).
+
+        Пачка пишется в порядке индекса по категории, чтобы вставки шли в соседние
+        страницы. Поисковый индекс и счётчики пополняются запросами на всю пачку
+        (BULK_INSERT_TRIGGERS): построчные триггеры на больших объёмах в разы медленнее.
+        Триггеры снимаются и возвращаются в той же транзакции, поэтому другие соединения
+        их отсутствия не видят.
+        """
+        today = today_str()
+        rows = list(rows)
+        with self._undoable("Импорт", overflow=len(rows) > UNDO_MAX_ROWS) as ids:
+            rows = sorted(((title, notes, deadline, status, self.category_id(category),
+                            today if status == STATUS_DONE else None)
+                           for title, notes, deadline, status, category in rows),
+                          key=lambda row: (row[4] or 0, row[3], row[2] or ""))
+            last_id = self.cursor.execute("SELECT max(id) FROM tasks").fetchone()[0] or 0
+            self.cursor.execute("SELECT name, sql FROM sqlite_master WHERE type = 'trigger' AND name IN (%s)"
+                                % ", ".join("?" * len(BULK_INSERT_TRIGGERS)), tuple(BULK_INSERT_TRIGGERS))
+            triggers = self.cursor.fetchall()
+            for name, _ in triggers:
+                self.cursor.execute(f"DROP TRIGGER {name}")
+
+            self.cursor.executemany("""INSERT INTO tasks (title, notes, deadline, status, category_id, completed_at)
+                VALUES (?, ?, ?, ?, ?, ?)""", rows)
+            count = self.cursor.rowcount
+
+            for name, sql in triggers:
+                for statement in BULK_INSERT_TRIGGERS[name]:
+                    self.cursor.execute(statement, (last_id,))
+                self.cursor.execute(sql)
+            if count <= UNDO_MAX_ROWS:
+                ids += [row[0] for row in self.cursor.execute("SELECT id FROM tasks WHERE id > ?", (last_id,))]
+            return count
+
+    @contextmanager
+    def bulk_mode(self):
+        """Увеличенный кэш страниц на время массовой загрузки"""
+        self.cursor.execute(f"PRAGMA cache_size = -{BULK_CACHE_SIZE_KIB}")
+        try:
+            yield
+        finally:
+            self.cursor.execute(f"PRAGMA cache_size = -{CACHE_SIZE_KIB}")
+
+    @timed
+    def delete_many(self, ids):
+        return self._execute_many("Удаление", UNDO_COLUMNS, ids,
+                                  "DELETE FROM tasks WHERE id IN (SELECT value FROM json_each(?))")
+
+    @timed
+    def set_category_many(self, ids, category):
+        with self._undoable("Смена категории", ids, ("category_id",)) as ids:
+            self.cursor.execute("UPDATE tasks SET category_id = ? WHERE id IN (SELECT value FROM json_each(?))",
+                                (self.category_id(category), json.dumps(ids)))
+            return self.cursor.rowcount
+
+    @timed
+    def shift_deadline_many(self, ids, days):
+        shift = f"{days:+d} days"
+        return self._execute_many("Перенос срока", ("deadline",), ids,
+                                  "UPDATE tasks SET deadline = date(deadline, ?) WHERE id IN (SELECT value FROM json_each(?))",
+                                  (shift,))
+
+    @timed
+    def get_changes(self, since_seq, force=False):
+        """Изменения задач, сделанные после since_seq, в том числе другими соединениями.
+
+        Если база не менялась (PRAGMA data_version; свои изменения это значение не
+        трогают, их проверяют с force=True), возвращает None. Иначе возвращает
+        (последний номер, {id: строка как в get_tasks или None для удалённой}).
+        Вместо словаря приходит None, если изменения нужно применить перечитыванием
+        списка: их слишком много, была массовая загрузка или часть журнала уже удалена.
+        since_seq=None — только узнать текущий номер.
+        """
+        version = self.cursor.execute("PRAGMA data_version").fetchone()[0]
+        if not force and version == self.data_version:
+            return None
+        self.data_version = version
+        self.load_categories()  # категории могли завести другие процессы
+
+        self.cursor.execute("SELECT min(seq), max(seq) FROM task_changes")
+        first, last = self.cursor.fetchone()
+        if since_seq is not None and (last or 0) < since_seq:
+            return last or 0, None  # номера пошли назад: базу заменили (восстановление снимка)
+        if since_seq is None or last is None or last <= since_seq:
+            return last or 0, {}
+        if first > since_seq + 1:
+            return last, None
+
+        # Лимит на разные id, а не на записи: смена статуса пишет по две записи на задачу,
+        # и при лимите на записи хвост изменений терялся бы за номером last
+        self.cursor.execute("SELECT DISTINCT task_id FROM task_changes WHERE seq > ? LIMIT ?",
+                            (since_seq, CHANGES_LIMIT + 1))
+        ids = {row[0] for row in self.cursor.fetchall()}
+        if len(ids) > CHANGES_LIMIT or None in ids:
+            return last, None
+
+        # Строки идут в список, поэтому заметки в них, как в списке, только началом
+        changes = dict.fromkeys(ids)
+        today = today_str()
+        self.cursor.execute(f"""SELECT tasks.id, title, {notes_preview("notes")}, deadline, status, categories.name
+            FROM tasks LEFT JOIN categories ON categories.id = tasks.category_id
+            WHERE tasks.id IN (SELECT value FROM json_each(?))""", (json.dumps(list(ids)),))
+        for tid, title, notes, deadline, status, category in self.cursor.fetchall():
+            changes[tid] = (tid, title, notes, deadline, effective_status(status, deadline, today), category)
+        return last, changes
+
+    @timed
+    def prune_changes(self, keep=CHANGES_KEEP):
+        """Оставляет в журнале изменений последние keep записей"""
+        with self.transaction():
+            self.cursor.execute("DELETE FROM task_changes WHERE seq <= (SELECT max(seq) FROM task_changes) - ?",
+                                (keep,))
+
+    @timed
+    def archive_done(self, days=ARCHIVE_AFTER_DAYS, batch_size=ARCHIVE_BATCH_SIZE):
+        """Переносит в архив одну пачку задач, выполненных больше days дней назад; возвращает их число.
+
+        Вызывается повторно, пока не вернёт 0: между пачками поток базы успевает отвечать
+        на другие запросы. Строка пишется в архив раньше, чем удаляется из основной базы;
+        если транзакция по двум файлам оборвётся посередине, повторный перенос просто
+        перезапишет архивную копию.
+        """
+        cutoff = (date.fromisoformat(today_str()) - timedelta(days=days)).isoformat()
+        with self.transaction():
+            self.cursor.execute("""SELECT id FROM tasks WHERE completed_at < ? AND status = ?
+                ORDER BY completed_at LIMIT ?""", (cutoff, STATUS_DONE, batch_size))
+            ids = [row[0] for row in self.cursor.fetchall()]
+            if not ids:
+                return 0
+
+            batch = (json.dumps(ids),)
+            # Копии, оставшиеся от оборванного переноса, перезаписываются и в счётчик не идут
+            self.cursor.execute("""UPDATE archive.counts SET n = n + ? - (SELECT count(*) FROM archive.tasks
+                WHERE id IN (SELECT value FROM json_each(?))) WHERE name = 'tasks'""", (len(ids), *batch))
+            self.cursor.execute("""INSERT OR REPLACE INTO archive.tasks
+                SELECT tasks.id, title, notes, deadline, status, categories.name, completed_at
+                FROM tasks LEFT JOIN categories ON categories.id = tasks.category_id
+                WHERE tasks.id IN (SELECT value FROM json_each(?))""", batch)
+            self.cursor.execute("DELETE FROM archive.tasks_fts WHERE rowid IN (SELECT value FROM json_each(?))", batch)
+            self.cursor.execute("""INSERT INTO archive.tasks_fts (rowid, title, notes)
+                SELECT id, title, notes FROM tasks WHERE id IN (SELECT value FROM json_each(?))""", batch)
+            self.cursor.execute("DELETE FROM tasks WHERE id IN (SELECT value FROM json_each(?))", batch)
+            # Отмена более ранних действий вернула бы в список задачи, которые теперь в архиве
+            self.cursor.execute("DELETE FROM undo_log")
+        return len(ids)
+
+    @timed
+    def count_archived(self):
+        self.cursor.execute("SELECT n FROM archive.counts WHERE name = 'tasks'")
+        return self.cursor.fetchone()[0]
+
+    @timed
+    def search_archive(self, search_text=None, limit=PAGE_SIZE):
+        """Задачи из архива (строки как в списке, с началом заметок): по совпадению с поиском
+        или, без поиска, начиная с выполненных последними"""
+        match = fts_query(search_text) if search_text else ""
+        if match:
+            # MATCH и bm25 не принимают имя со схемой: в запросе tasks_fts — таблица архива из FROM
+            self.cursor.execute(f"""SELECT t.id, t.title, {notes_preview("t.notes")}, deadline, status, category
+                FROM archive.tasks_fts JOIN archive.tasks AS t ON t.id = tasks_fts.rowid
+                WHERE tasks_fts MATCH ? ORDER BY bm25(tasks_fts, 10.0, 1.0), t.id LIMIT ?""", (match, limit))
+        else:
+            self.cursor.execute(f"""SELECT id, title, {notes_preview("notes")}, deadline, status, category
+                FROM archive.tasks ORDER BY completed_at DESC, id DESC LIMIT ?""", (limit,))
+        return self.cursor.fetchall()
+
+    def iter_archive(self, chunk_size=1000):
+        """Все задачи архива порциями, в порядке id"""
+        cursor = self.conn.cursor()
+        cursor.execute("SELECT id, title, notes, deadline, status, category FROM archive.tasks ORDER BY id")
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            yield rows
+
+    @timed
+    def maintain(self, pages=VACUUM_PAGES):
+        """Обслуживание файла: возвращает ему до pages свободных страниц и обновляет статистику планировщика.
+
+        Инкрементальная очистка включается один раз полным VACUUM; дальше каждый вызов
+        освобождает не больше pages страниц и не блокирует базу надолго.
+        """
+        self.flush()  # VACUUM не выполняется внутри транзакции
+        if self.cursor.execute("PRAGMA main.auto_vacuum").fetchone()[0] != 2:
+            self.cursor.execute("PRAGMA main.auto_vacuum = INCREMENTAL")
+            self.cursor.execute("VACUUM main")
+        else:
+            self.cursor.execute(f"PRAGMA main.incremental_vacuum({int(pages)})").fetchall()
+        # Выборочный ANALYZE таблиц, у которых статистика устарела
+        self.cursor.execute("PRAGMA analysis_limit = 1000")
+        self.cursor.execute("PRAGMA optimize")
+
+    @timed
+    def count_tasks(self):
+        self.cursor.execute("SELECT count(*) FROM tasks")
+        return self.cursor.fetchone()[0]
+
+    @timed
     def get_all_categories(self):
-        self.cursor.execute("SELECT DISTINCT category FROM tasks")
-        db_cats = {row[0] for row in self.cursor.fetchall() if row[0]}
-        if ADD_NEW_CAT_TEXT in db_cats:
-            db_cats.remove(ADD_NEW_CAT_TEXT)
-        return sorted(list(db_cats.union(set(DEFAULT_CATEGORIES))))
+        """Имена категорий по алфавиту; берутся из кэша, таблица задач не читается"""
+        return sorted(name for name in self.category_ids.keys() | set(DEFAULT_CATEGORIES) if name != ADD_NEW_CAT_TEXT)
+
+    @timed
+    def get_facet_counts(self):
+        """Число задач по парам (категория, статус) с учётом просрочки на сегодня.
+        Читает только счётчики task_counts, поэтому не зависит от размера таблицы задач."""
+        self.cursor.execute("""SELECT category_id,
+                CASE WHEN status = ? THEN ? WHEN deadline != '' AND deadline < ? THEN ? ELSE ? END, sum(n)
+            FROM task_counts GROUP BY 1, 2""",
+                            (STATUS_DONE, STATUS_DONE, today_str(), STATUS_OVERDUE, STATUS_PENDING))
+        return {(self.category_names.get(cid), status): n for cid, status, n in self.cursor.fetchall() if n}
 
+    @timed
     def get_stats(self):
-        """Возвращает статистику для диалога"""
-        self.cursor.execute("SELECT status FROM tasks")
-        rows = self.cursor.fetchall()
-        total = len(rows)
-        done = sum(1 for r in rows if r[0] == STATUS_DONE)
-        overdue = sum(1 for r in rows if r[0] == STATUS_OVERDUE)
-        pending = sum(1 for r in rows if r[0] == STATUS_PENDING)
-        return total, done, overdue, pending
\ No newline at end of file
+        """Возвращает статистику для диалога: (всего, выполнено, просрочено, в работе, в архиве).
+        Задачи архива выполнены и входят во «всего» и «выполнено»."""
+        by_status = dict.fromkeys(STATUS_RANK, 0)
+        for (_, status), n in self.get_facet_counts().items():
+            by_status[status] += n
+        archived = self.count_archived()
+        total = sum(by_status.values()) + archived
+        return total, by_status[STATUS_DONE] + archived, by_status[STATUS_OVERDUE], by_status[STATUS_PENDING], archived
+
+    @timed
+    def get_history(self, days=14):
+        """Сколько задач создано и выполнено по дням: [(день, создано, выполнено)] за последние days дней"""
+        last_day = date.fromisoformat(today_str())
+        first_day = last_day - timedelta(days=days - 1)
+        self.cursor.execute("SELECT day, created, completed FROM daily_activity WHERE day >= ? ORDER BY day",
+                            (first_day.isoformat(),))
+        activity = {day: (created, completed) for day, created, completed in self.cursor.fetchall()}
+        history = []
+        for offset in range(days):
+            day = (first_day + timedelta(days=offset)).isoformat()
+            history.append((day, *activity.get(day, (0, 0))))
+        return history
\ No newline at end of file
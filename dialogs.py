@@ -1,12 +1,16 @@
 from PyQt6.QtWidgets import (QDialog, QLineEdit, QTextEdit, QComboBox,
                              QDateEdit, QDialogButtonBox, QFormLayout,
-                             QInputDialog, QVBoxLayout, QLabel, QProgressBar, QPushButton)
-from PyQt6.QtCore import QDate
+                             QInputDialog, QVBoxLayout, QLabel, QProgressBar, QPushButton, QListView)
+from PyQt6.QtCore import QDate, QTimer
 from database import ADD_NEW_CAT_TEXT
+from models import TaskListModel
+from widgets import TaskDelegate, ThroughputChart
+from profiling import timed
 
 
 class TaskDialog(QDialog):
 
+    @timed
     def __init__(self, available_categories, title="", notes="", deadline=None, category=None, parent=None):
         super().__init__(parent)
         self.setWindowTitle("Задача")
@@ -67,16 +71,19 @@ class TaskDialog(QDialog):
 
 class StatsDialog(QDialog):
 
-    def __init__(self, db, parent=None):
+    @timed
+    def __init__(self, stats, history, parent=None):
         super().__init__(parent)
         self.setWindowTitle("Статистика продуктивности")
-        self.setFixedSize(300, 250)
+        self.setFixedSize(360, 440)
 
-        total, done, overdue, pending = db.get_stats()
+        total, done, overdue, pending, archived = stats
 
         layout = QVBoxLayout(self)
         layout.addWidget(QLabel(f"<b>Всего задач:</b> {total}"))
         layout.addWidget(QLabel(f"✅ Выполнено: {done}"))
+        if archived:
+            layout.addWidget(QLabel(f"🗄 Из них в архиве: {archived}"))
         layout.addWidget(QLabel(f"❌ Просрочено: {overdue}"))
         layout.addWidget(QLabel(f"⏳ В работе: {pending}"))
         layout.addSpacing(20)
@@ -92,7 +99,53 @@ class StatsDialog(QDialog):
             progress_bar.setValue(0)
 
         layout.addWidget(progress_bar)
+        layout.addSpacing(10)
+
+        layout.addWidget(QLabel(f"За последние {len(history)} дней:"))
+        layout.addWidget(ThroughputChart(history))
 
         btn = QPushButton("Закрыть")
         btn.clicked.connect(self.accept)
-        layout.addWidget(btn)
\ No newline at end of file
+        layout.addWidget(btn)
+
+
+class ArchiveDialog(QDialog):
+    """Просмотр и поиск по архиву давно выполненных задач, только чтение"""
+
+    @timed
+    def __init__(self, worker, theme, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Архив задач")
+        self.resize(460, 600)
+        self.worker = worker
+
+        self.search_input = QLineEdit()
+        self.search_input.setPlaceholderText("🔍 Поиск по архиву...")
+        self.search_timer = QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(150)
+
+        self.task_model = TaskListModel(self)
+        self.task_list_view = QListView()
+        self.task_list_view.setModel(self.task_model)
+        self.task_list_view.setItemDelegate(TaskDelegate(theme, self))
+        self.task_list_view.setSpacing(8)
+        self.task_list_view.setUniformItemSizes(True)
+
+        self.count_label = QLabel()
+        btn = QPushButton("Закрыть")
+        btn.clicked.connect(self.accept)
+
+        layout = QVBoxLayout(self)
+        layout.addWidget(self.search_input)
+        layout.addWidget(self.count_label)
+        layout.addWidget(self.task_list_view)
+        layout.addWidget(btn)
+
+        self.search_input.textChanged.connect(self.search_timer.start)
+        self.search_timer.timeout.connect(self.load)
+        self.worker.call("count_archived", callback=lambda n: self.count_label.setText(f"В архиве задач: {n}"))
+        self.load()
+
+    def load(self):
+        self.worker.call("search_archive", self.search_input.text(), callback=self.task_model.set_rows)
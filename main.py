@@ -1,82 +1,162 @@
 import sys
-import csv
+import time
+from functools import partial
+
+STARTUP_T0 = time.perf_counter()
+
 from PyQt6.QtWidgets import (
     QApplication, QWidget, QVBoxLayout, QHBoxLayout,
-    QListWidget, QListWidgetItem, QLineEdit, QPushButton,
-    QLabel, QComboBox, QFileDialog, QMessageBox
+    QListView, QAbstractItemView, QLineEdit, QPushButton,
+    QLabel, QComboBox, QFileDialog, QMessageBox, QMenu, QProgressDialog
 )
-from PyQt6.QtCore import Qt, QDate
+from PyQt6.QtCore import Qt, QObject, QEvent, QDateTime, QTime, QTimer, pyqtSignal
+from PyQt6.QtGui import QShortcut, QKeySequence
 
 # Импорт наших модулей
-from database import TaskDatabase, STATUS_PENDING, STATUS_DONE, STATUS_OVERDUE
-from widgets import TaskWidget
-from dialogs import TaskDialog, StatsDialog
-
-LIGHT_THEME = """
-    QWidget { background-color: #f0f2f5; color: #000000; }
-    QLineEdit, QTextEdit, QComboBox, QDateEdit { 
-        background-color: white; color: black; border: 1px solid #ccc; border-radius: 5px; padding: 5px; 
-    }
-    QListWidget { background: transparent; border: none; outline: 0; }
-    QPushButton { background-color: #e0e0e0; border: 1px solid #ccc; border-radius: 5px; padding: 5px; }
-    QPushButton:hover { background-color: #d0d0d0; }
-    QDialog { background-color: #ffffff; }
-    QLabel { background-color: transparent; }
-"""
-
-DARK_THEME = """
-    QWidget { background-color: #121212; color: #ffffff; }
-    QLineEdit, QTextEdit, QComboBox, QDateEdit { 
-        background-color: #2d2d2d; color: #e0e0e0; border: 1px solid #444; border-radius: 5px; padding: 5px; 
-    }
-    QListWidget { background: transparent; border: none; outline: 0; }
-    QPushButton { background-color: #333333; color: #e0e0e0; border: 1px solid #444; border-radius: 5px; padding: 5px; }
-    QPushButton:hover { background-color: #444444; }
-    QDialog { background-color: #1e1e1e; }
-    QMessageBox { background-color: #1e1e1e; color: white; }
-    QLabel { 
-        color: #e0e0e0; 
-        background-color: transparent;
-    }
-"""
+from database import STATUS_PENDING, STATUS_DONE, STATUS_OVERDUE, DEFAULT_CATEGORIES, PAGE_SIZE, task_sort_key
+from models import TaskListModel, TaskIdRole
+from widgets import TaskDelegate
+from themes import LIGHT_THEME, DARK_THEME
+from worker import DatabaseWorker, SnapshotWorker
+from profiling import tracer, timed, enable as enable_profiling
+
+# Диалоги и CSV не нужны для первого экрана: они импортируются при первом использовании
+
+IMPORTS_DONE = time.perf_counter()
+
+
+class StartupReport(QObject):
+    """Разбивка времени запуска (python main.py --startup-report), отсчёт от начала импорта main.py.
+
+    Первая отрисовка — окно показано пользователю; готовность к вводу — окно
+    отрисовано, первая страница задач загружена и очередь событий после этого разобрана.
+    """
+
+    def __init__(self, window):
+        super().__init__(window)
+        self.marks = {"импорт модулей": IMPORTS_DONE, "окно создано": time.perf_counter()}
+        window.installEventFilter(self)
+        window.tasks_loaded.connect(self.on_tasks_loaded)
+
+    def mark(self, name):
+        self.marks[name] = time.perf_counter()
+        if "первая отрисовка" in self.marks and "первая страница задач" in self.marks:
+            QTimer.singleShot(0, self.report)
+
+    def eventFilter(self, obj, event):
+        if event.type() == QEvent.Type.Paint:
+            obj.removeEventFilter(self)
+            QTimer.singleShot(0, lambda: self.mark("первая отрисовка"))
+        return False
+
+    def on_tasks_loaded(self):
+        self.parent().tasks_loaded.disconnect(self.on_tasks_loaded)
+        self.mark("первая страница задач")
+
+    def report(self):
+        self.marks["готово к вводу"] = time.perf_counter()
+        for name, moment in sorted(self.marks.items(), key=lambda item: item[1]):
+            print(f"{name:<24}{(moment - STARTUP_T0) * 1000:8.1f} мс", file=sys.stderr)
 
 
 class ToDoApp(QWidget):
+    CHANGE_POLL_MS = 500
+    GROUP_COMMIT_MS = 20  # правки, сделанные подряд быстрее этого, пишутся на диск одним коммитом
+    MAINTENANCE_DELAY_MS = 10000
+    SNAPSHOT_INTERVAL_H = 6  # снимок базы по расписанию, если последний старше
+    SNAPSHOT_CHECK_MS = 10 * 60 * 1000
+
+    tasks_loaded = pyqtSignal(int)  # загрузка списка завершена; число затронутых строк
+
     def __init__(self):
         super().__init__()
-        self.db = TaskDatabase()
         self.is_dark_mode = False  # Флаг текущей темы
+        self.categories = list(DEFAULT_CATEGORIES)
+        self.facets = {}
+        self.load_generation = 0
+        self.load_filters = (None, None, "")
+        self.next_key = None
+        self.loading = False
+        self.change_seq = None
+        self.polling = False
+
+        self.worker = DatabaseWorker(group_commit_ms=self.GROUP_COMMIT_MS, parent=self)
+        self.worker.rows_ready.connect(self.on_rows_ready)
+        self.worker.error.connect(self.show_db_error)
+        self.worker.start()
+        self.snapshot_worker = SnapshotWorker(self.worker.db_name, parent=self)
+        self.snapshot_worker.progress.connect(self.on_snapshot_progress)
+        self.snapshot_worker.done.connect(self.on_snapshot_done)
+        self.snapshot_worker.failed.connect(self.on_snapshot_failed)
+
         self.init_ui()
+        self.update_categories()
+        # Номер в журнале изменений берётся до первой загрузки: всё, что случится позже, придёт дельтой
+        self.worker.call("get_changes", None, callback=self.on_changes)
         self.load_tasks()
 
+        # Изменения из других окон и процессов; опрос дешёвый, пока база не менялась
+        self.change_timer = QTimer(self)
+        self.change_timer.setInterval(self.CHANGE_POLL_MS)
+        self.change_timer.timeout.connect(self.poll_changes)
+        self.change_timer.start()
+
+        # Просрочка вычисляется при чтении, поэтому пересчитывать её нужно только при смене даты
+        self.midnight_timer = QTimer(self)
+        self.midnight_timer.setSingleShot(True)
+        self.midnight_timer.timeout.connect(self.check_overdue)
+        self.schedule_midnight_check()
+
+        # Архивация и обслуживание базы — не раньше, чем окно загрузится и успокоится
+        QTimer.singleShot(self.MAINTENANCE_DELAY_MS, self.run_maintenance)
+        QTimer.singleShot(self.MAINTENANCE_DELAY_MS, self.snapshot_if_due)
+        self.snapshot_timer = QTimer(self)
+        self.snapshot_timer.setInterval(self.SNAPSHOT_CHECK_MS)
+        self.snapshot_timer.timeout.connect(self.snapshot_if_due)
+        self.snapshot_timer.start()
+
         self.apply_theme()
 
+    @timed
     def init_ui(self):
         self.setWindowTitle("ToDo Список Pro")
         self.resize(500, 750)
 
         self.title_label = QLabel("Менеджер задач")
         self.title_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
-        self.title_label.setStyleSheet("font-size: 22px; font-weight: bold; margin: 10px;")
+        self.title_label.setObjectName("titleLabel")
 
         top_menu_layout = QHBoxLayout()
         self.theme_btn = QPushButton("🌓 Тема")
         self.stats_btn = QPushButton("📊 Статистика")
         self.export_btn = QPushButton("💾 Экспорт")
+        self.import_btn = QPushButton("📂 Импорт")
+        self.archive_btn = QPushButton("🗄 Архив")
+        self.snapshot_btn = QPushButton("🛟 Снимки")
+        self.snapshot_btn.setMenu(QMenu(self.snapshot_btn))
 
         top_menu_layout.addWidget(self.theme_btn)
         top_menu_layout.addWidget(self.stats_btn)
         top_menu_layout.addWidget(self.export_btn)
+        top_menu_layout.addWidget(self.import_btn)
+        top_menu_layout.addWidget(self.archive_btn)
+        top_menu_layout.addWidget(self.snapshot_btn)
 
         self.search_input = QLineEdit()
-        self.search_input.setPlaceholderText("🔍 Поиск по названию...")
+        self.search_input.setPlaceholderText("🔍 Поиск по названию и заметкам...")
+
+        # Поиск запускается после паузы в наборе: новый символ откладывает ещё не выполненный запрос
+        self.search_timer = QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(150)
 
 
         self.filter_layout = QHBoxLayout()
         self.cat_filter = QComboBox()
 
         self.status_filter = QComboBox()
-        self.status_filter.addItems(["Все статусы", STATUS_PENDING, STATUS_DONE, STATUS_OVERDUE])
+        for status in ["Все статусы", STATUS_PENDING, STATUS_DONE, STATUS_OVERDUE]:
+            self.status_filter.addItem(status, status)
 
         self.reset_filter_btn = QPushButton("❌")
         self.reset_filter_btn.setFixedWidth(30)
@@ -86,17 +166,33 @@ class ToDoApp(QWidget):
         self.filter_layout.addWidget(self.status_filter)
         self.filter_layout.addWidget(self.reset_filter_btn)
 
-        self.task_list_widget = QListWidget()
-        self.task_list_widget.setSpacing(8)
+        self.task_model = TaskListModel(self)
+        self.task_model.fetch_requested.connect(self.fetch_more)
+        self.task_delegate = TaskDelegate(self.theme(), self)
+
+        self.task_list_view = QListView()
+        self.task_list_view.setModel(self.task_model)
+        self.task_list_view.setItemDelegate(self.task_delegate)
+        self.task_list_view.setSpacing(8)
+        self.task_list_view.setUniformItemSizes(True)
+        self.task_list_view.setVerticalScrollMode(QAbstractItemView.ScrollMode.ScrollPerPixel)
+        self.task_list_view.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+        self.task_list_view.setSelectionMode(QAbstractItemView.SelectionMode.ExtendedSelection)
+        self.task_list_view.setContextMenuPolicy(Qt.ContextMenuPolicy.CustomContextMenu)
 
 
         self.add_btn = QPushButton("+ Создать задачу")
-        self.add_btn.setStyleSheet(
-            "background-color: #007bff; color: white; font-weight: bold; padding: 12px; border-radius: 8px;")
+        self.add_btn.setObjectName("addButton")
 
         self.complete_btn = QPushButton("Выполнить / Вернуть")
         self.remove_btn = QPushButton("Удалить выбранное")
-        self.remove_btn.setStyleSheet("background-color: #842029; color: white; padding: 8px; border-radius: 5px;")
+        self.remove_btn.setObjectName("removeButton")
+        self.undo_btn = QPushButton("↶")
+        self.undo_btn.setFixedWidth(40)
+        self.undo_btn.setToolTip("Отменить (Ctrl+Z)")
+        self.redo_btn = QPushButton("↷")
+        self.redo_btn.setFixedWidth(40)
+        self.redo_btn.setToolTip("Повторить (Ctrl+Shift+Z)")
 
         layout = QVBoxLayout(self)
         layout.addLayout(top_menu_layout)
@@ -104,162 +200,446 @@ class ToDoApp(QWidget):
         layout.addWidget(self.search_input)
         layout.addLayout(self.filter_layout)
         layout.addWidget(self.add_btn)
-        layout.addWidget(self.task_list_widget)
+        layout.addWidget(self.task_list_view)
 
         btns_layout = QHBoxLayout()
         btns_layout.addWidget(self.complete_btn)
         btns_layout.addWidget(self.remove_btn)
+        btns_layout.addWidget(self.undo_btn)
+        btns_layout.addWidget(self.redo_btn)
         layout.addLayout(btns_layout)
 
         self.add_btn.clicked.connect(self.open_add_dialog)
         self.complete_btn.clicked.connect(self.toggle_task_status)
         self.remove_btn.clicked.connect(self.remove_task)
-        self.task_list_widget.itemDoubleClicked.connect(self.edit_task)
-        self.task_list_widget.itemSelectionChanged.connect(self.update_selection_styles)
-
-        self.cat_filter.currentTextChanged.connect(self.load_tasks)
-        self.status_filter.currentTextChanged.connect(self.load_tasks)
+        self.undo_btn.clicked.connect(self.undo)
+        self.redo_btn.clicked.connect(self.redo)
+        QShortcut(QKeySequence.StandardKey.Undo, self, self.undo)
+        QShortcut(QKeySequence.StandardKey.Redo, self, self.redo)
+        self.task_list_view.doubleClicked.connect(self.edit_task)
+        self.task_list_view.customContextMenuRequested.connect(self.show_task_menu)
+
+        # Текст пунктов меняется вместе со счётчиками, поэтому следим за индексом, а не за текстом
+        self.cat_filter.currentIndexChanged.connect(self.on_filter_changed)
+        self.status_filter.currentIndexChanged.connect(self.on_filter_changed)
         self.reset_filter_btn.clicked.connect(self.reset_filters)
-        self.search_input.textChanged.connect(self.load_tasks)
+        self.search_input.textChanged.connect(self.search_timer.start)
+        self.search_timer.timeout.connect(self.load_tasks)
 
         self.stats_btn.clicked.connect(self.show_stats)
         self.export_btn.clicked.connect(self.export_tasks)
+        self.import_btn.clicked.connect(self.import_tasks)
+        self.archive_btn.clicked.connect(self.show_archive)
+        self.snapshot_btn.menu().aboutToShow.connect(self.fill_snapshot_menu)
         self.theme_btn.clicked.connect(self.toggle_theme)
 
+    def theme(self):
+        return DARK_THEME if self.is_dark_mode else LIGHT_THEME
+
     def toggle_theme(self):
         self.is_dark_mode = not self.is_dark_mode
         self.apply_theme()
 
-        for i in range(self.task_list_widget.count()):
-            item = self.task_list_widget.item(i)
-            widget = self.task_list_widget.itemWidget(item)
-            if widget:
-                widget.set_theme(self.is_dark_mode)
-
+    @timed
     def apply_theme(self):
-        app_style = DARK_THEME if self.is_dark_mode else LIGHT_THEME
-        QApplication.instance().setStyleSheet(app_style)
+        # Одна таблица стилей на всё приложение; карточки задач перерисовывает делегат, без пересборки стилей
+        theme = self.theme()
+        QApplication.instance().setStyleSheet(theme.stylesheet)
+        self.task_delegate.set_theme(theme)
+        self.task_list_view.viewport().update()
 
-        self.add_btn.setStyleSheet(
-            "background-color: #007bff; color: white; font-weight: bold; padding: 12px; border-radius: 8px;")
-
-        if self.is_dark_mode:
-            self.remove_btn.setStyleSheet("background-color: #61131a; color: white; padding: 8px; border-radius: 5px;")
-        else:
-            self.remove_btn.setStyleSheet("background-color: #dc3545; color: white; padding: 8px; border-radius: 5px;")
+    def update_categories(self):
+        """Список категорий меняется только при появлении новой, поэтому запрашивается
+        при запуске и после изменений, которые могли её завести"""
+        self.worker.call("get_all_categories", callback=self.set_categories)
 
     def update_filter_combo(self):
-        current = self.cat_filter.currentText()
-        all_cats = self.db.get_all_categories()
+        self.worker.call("get_facet_counts", callback=self.set_facets)
 
-        self.cat_filter.blockSignals(True)
-        self.cat_filter.clear()
-        self.cat_filter.addItems(["Все категории"] + all_cats)
+    def set_categories(self, all_cats):
+        """Вставляет в фильтр новые категории и убирает пропавшие; остальные пункты не трогаются"""
+        self.categories = all_cats
+        current = self.cat_filter.currentData()
 
-        idx = self.cat_filter.findText(current)
-        self.cat_filter.setCurrentIndex(idx if idx >= 0 else 0)
+        self.cat_filter.blockSignals(True)
+        if self.cat_filter.count() == 0:
+            self.cat_filter.addItem("Все категории", "Все категории")
+        i = 1
+        for category in all_cats:
+            while i < self.cat_filter.count() and self.cat_filter.itemData(i) not in all_cats:
+                self.cat_filter.removeItem(i)
+            if i < self.cat_filter.count() and self.cat_filter.itemData(i) == category:
+                i += 1
+                continue
+            self.cat_filter.insertItem(i, category, category)
+            i += 1
+        while self.cat_filter.count() > i:
+            self.cat_filter.removeItem(i)
         self.cat_filter.blockSignals(False)
 
+        if self.cat_filter.currentData() != current:
+            self.cat_filter.setCurrentIndex(0)  # выбранная категория пропала
+        self.update_badges()
+
+    def set_facets(self, facets):
+        self.facets = facets
+        self.update_badges()
+
+    def update_badges(self):
+        """Подписывает у пунктов фильтров число задач с учётом выбранного значения второго фильтра"""
+        category = self.cat_filter.currentData()
+        status = self.status_filter.currentData()
+        by_category = {}
+        by_status = {}
+        for (cat, st), n in self.facets.items():
+            if status == "Все статусы" or st == status:
+                by_category[cat] = by_category.get(cat, 0) + n
+            if category == "Все категории" or cat == category:
+                by_status[st] = by_status.get(st, 0) + n
+
+        for combo, counts in ((self.cat_filter, by_category), (self.status_filter, by_status)):
+            for i in range(combo.count()):
+                value = combo.itemData(i)
+                n = sum(counts.values()) if i == 0 else counts.get(value, 0)
+                text = f"{value} ({n})"
+                if combo.itemText(i) != text:
+                    combo.setItemText(i, text)
+
+    def on_filter_changed(self):
+        self.update_badges()
+        self.load_tasks()
+
     def reset_filters(self):
         self.cat_filter.setCurrentIndex(0)
         self.status_filter.setCurrentIndex(0)
         self.search_input.clear()
 
     def load_tasks(self):
-        self.task_list_widget.clear()
-
-        rows = self.db.get_tasks(
-            category_filter=self.cat_filter.currentText(),
-            status_filter=self.status_filter.currentText(),
-            search_text=self.search_input.text().strip()
-        )
-
-        for row in rows:
-            tid, title, notes, deadline, status, category = row
-            category = category if category else "Без категории"
-
-            item = QListWidgetItem(self.task_list_widget)
-            custom_widget = TaskWidget(title, notes, deadline, status, category, item.isSelected(), self.is_dark_mode)
-            item.setSizeHint(custom_widget.sizeHint())
-            item.setData(Qt.ItemDataRole.UserRole, tid)
-            item.setData(Qt.ItemDataRole.UserRole + 1, {
-                "title": title, "notes": notes, "deadline": deadline, "status": status, "category": category
-            })
-            self.task_list_widget.setItemWidget(item, custom_widget)
-
-        if self.sender() != self.cat_filter:
+        """Новый запрос списка (сменились фильтры): первая страница показывается по мере поступления"""
+        self.load_filters = (self.cat_filter.currentData(), self.status_filter.currentData(),
+                             self.search_input.text().strip())
+        self._start_load(refresh=False)
+
+    def refresh_tasks(self):
+        """Повтор текущего запроса после изменений для уже загруженной части списка:
+        затрагиваются только изменившиеся строки"""
+        self._start_load(refresh=True, limit=max(self.task_model.rowCount(), PAGE_SIZE))
+
+    def fetch_more(self):
+        """Следующая страница при прокрутке к концу списка"""
+        self.loading = True
+        self.load_refresh = False
+        self.load_pos = self.task_model.rowCount()
+        self.load_touched = 0
+        self.load_started = time.perf_counter()
+        self.worker.load_tasks(*self.load_filters, after=self.next_key)
+
+    def _start_load(self, refresh, limit=PAGE_SIZE):
+        self.loading = True
+        self.load_refresh = refresh
+        self.load_pos = 0
+        self.load_touched = 0
+        self.task_model.set_more(False)
+        self.load_started = time.perf_counter()
+        self.load_generation = self.worker.load_tasks(*self.load_filters, limit=limit)
+
+    @timed
+    def on_rows_ready(self, generation, rows, last, next_key):
+        if generation != self.load_generation:
+            return  # ответ на запрос, который уже заменён новым
+
+        if last:
+            self.loading = False
+            # До вставки последней порции, чтобы представление сразу могло запросить следующую страницу
+            self.next_key = next_key
+            self.task_model.set_more(next_key is not None)
+
+        if self.load_refresh:
+            self.load_touched += self.task_model.merge_rows(rows, self.load_pos)
+        else:
+            if self.load_pos == 0:
+                self.task_model.clear()
+            self.load_touched += self.task_model.append_rows(rows)
+        self.load_pos += len(rows)
+
+        if last:
+            if self.load_refresh:
+                self.load_touched += self.task_model.truncate(self.load_pos)
+                self.update_filter_combo()
+            elif self.load_pos <= PAGE_SIZE:
+                self.update_filter_combo()
+            if tracer.enabled:
+                # Загрузка идёт через поток базы, поэтому её интервал — от запроса до последней порции
+                tracer.add("ToDoApp.load_tasks:всего", self.load_started)
+            self.tasks_loaded.emit(self.load_touched)
+
+    def schedule_midnight_check(self):
+        now = QDateTime.currentDateTime()
+        midnight = QDateTime(now.date().addDays(1), QTime(0, 0))
+        self.midnight_timer.start(now.msecsTo(midnight) + 1000)
+
+    def check_overdue(self):
+        """С наступлением нового дня часть задач становится просроченной и переезжает
+        в другую часть списка; загруженная часть списка перечитывается"""
+        self.refresh_tasks()
+        self.schedule_midnight_check()
+        self.run_maintenance()
+
+    def run_maintenance(self):
+        """Переносит в архив давно выполненные задачи по пачке за запрос, чтобы между пачками
+        поток базы отвечал окну; перенесённые строки уходят из списка через журнал изменений"""
+        def on_batch(moved):
+            if moved:
+                self.worker.call("archive_done", callback=on_batch)
+                self.poll_changes()
+            else:
+                self.worker.call("maintain")
+
+        self.worker.call("archive_done", callback=on_batch)
+
+    def write(self, method, *args):
+        """Изменение выполняется в потоке базы, после него список обновляется по журналу изменений"""
+        self.worker.call(method, *args, callback=lambda _: self.poll_changes(force=True))
+
+    def poll_changes(self, force=False):
+        if self.change_seq is None or (self.polling and not force):
+            return
+        self.polling = True
+        self.worker.call("get_changes", self.change_seq, force, callback=self.on_changes)
+
+    @timed
+    def on_changes(self, result):
+        self.polling = False
+        if result is None:
+            return  # база не менялась
+        self.change_seq, changes = result
+        if changes == {}:
+            return
+
+        category, status, search = self.load_filters
+        if changes is None or search or self.loading:
+            # Место строки в результатах поиска по дельте не вычислить, а идущую загрузку проще заменить
+            self.refresh_tasks()
+        else:
+            rows = [row for row in changes.values() if row is not None
+                    and category in (None, "Все категории", row[5])
+                    and status in (None, "Все статусы", row[4])]
+            removed = changes.keys() - {row[0] for row in rows}
+            self.task_model.apply_changes(rows, removed, task_sort_key, self.next_key)
             self.update_filter_combo()
 
-    def update_selection_styles(self):
-        for i in range(self.task_list_widget.count()):
-            item = self.task_list_widget.item(i)
-            widget = self.task_list_widget.itemWidget(item)
-            if widget:
-                widget.set_theme(self.is_dark_mode)
-                widget.is_selected = item.isSelected()
-                widget.update_style()
+        if changes is None or any(row and row[5] and row[5] not in self.categories for row in changes.values()):
+            self.update_categories()
 
     def open_add_dialog(self):
-        cats = self.db.get_all_categories()
-        dialog = TaskDialog(cats, parent=self)
+        from dialogs import TaskDialog
+        dialog = TaskDialog(self.categories, parent=self)
         if dialog.exec():
             title, notes, deadline, category = dialog.get_data()
             if not title: return
-            self.db.add_task(title, notes, deadline, category)
-            self.load_tasks()
+            self.write("add_task", title, notes, deadline, category)
 
-    def edit_task(self, item):
-        tid = item.data(Qt.ItemDataRole.UserRole)
-        data = item.data(Qt.ItemDataRole.UserRole + 1)
-        cats = self.db.get_all_categories()
+    def edit_task(self, index):
+        # В списке только начало заметок, поэтому задача для диалога читается из базы целиком
+        self.worker.call("get_task", index.data(TaskIdRole), callback=self.open_edit_dialog)
 
-        dialog = TaskDialog(cats, data['title'], data['notes'], data['deadline'], data['category'], self)
+    def open_edit_dialog(self, row):
+        if row is None:
+            return  # задачу успели удалить
+        tid, title, notes, deadline, status, category = row
+
+        from dialogs import TaskDialog
+        dialog = TaskDialog(self.categories, title, notes, deadline, category or "Без категории", self)
         if dialog.exec():
             title, notes, deadline, category = dialog.get_data()
-            self.db.update_task(tid, title, notes, deadline, data['status'], category)
-            self.load_tasks()
+            self.write("update_task", tid, title, notes, deadline, status, category)
+
+    def selected_ids(self):
+        return [index.data(TaskIdRole) for index in self.task_list_view.selectionModel().selectedRows()]
 
     def toggle_task_status(self):
-        today = QDate.currentDate().toString("yyyy-MM-dd")
-        for i in range(self.task_list_widget.count()):
-            item = self.task_list_widget.item(i)
-            if item.isSelected():
-                tid = item.data(Qt.ItemDataRole.UserRole)
-                data = item.data(Qt.ItemDataRole.UserRole + 1)
+        ids = self.selected_ids()
+        if ids:
+            self.write("toggle_status_many", ids)
 
-                new_status = STATUS_DONE if data['status'] != STATUS_DONE else \
-                    (STATUS_OVERDUE if data['deadline'] < today else STATUS_PENDING)
+    def remove_task(self):
+        ids = self.selected_ids()
+        if ids:
+            self.write("delete_many", ids)
 
-                self.db.update_status(tid, new_status)
-        self.load_tasks()
+    def undo(self):
+        # Отмена — обычная запись: восстановленные или удалённые ею строки придут по журналу изменений
+        self.write("undo")
 
-    def remove_task(self):
-        for i in range(self.task_list_widget.count()):
-            item = self.task_list_widget.item(i)
-            if item.isSelected():
-                self.db.delete_task(item.data(Qt.ItemDataRole.UserRole))
-        self.load_tasks()
+    def redo(self):
+        self.write("redo")
+
+    def show_task_menu(self, pos):
+        ids = self.selected_ids()
+        if not ids:
+            return
+
+        menu = QMenu(self)
+        menu.addAction("📅 Перенести на день", lambda: self.shift_deadlines(ids, 1))
+        menu.addAction("📅 Перенести на неделю", lambda: self.shift_deadlines(ids, 7))
+        category_menu = menu.addMenu("📁 Категория")
+        for category in self.categories:
+            category_menu.addAction(category, lambda cat=category: self.recategorize(ids, cat))
+        menu.exec(self.task_list_view.viewport().mapToGlobal(pos))
+
+    def shift_deadlines(self, ids, days):
+        self.write("shift_deadline_many", ids, days)
+
+    def recategorize(self, ids, category):
+        self.write("set_category_many", ids, category)
 
     def show_stats(self):
-        dialog = StatsDialog(self.db, self)
-        dialog.exec()
+        from dialogs import StatsDialog
+        self.worker.call(lambda db: (db.get_stats(), db.get_history()),
+                         callback=lambda result: StatsDialog(*result, parent=self).exec())
+
+    def show_archive(self):
+        from dialogs import ArchiveDialog
+        ArchiveDialog(self.worker, self.theme(), parent=self).exec()
+
+    def run_with_progress(self, label, func, *args, callback=None, errback=None):
+        """Долгая операция в потоке базы с окном прогресса и кнопкой отмены"""
+        dialog = QProgressDialog(label, "Отмена", 0, 1000, self)
+        dialog.setWindowModality(Qt.WindowModality.WindowModal)
+        dialog.setMinimumDuration(300)
+        dialog.setAutoClose(False)
+        dialog.setAutoReset(False)
+
+        def on_progress(done, total):
+            dialog.setValue(int(done * 1000 / total) if total else 0)
+
+        def on_done(result):
+            dialog.close()
+            callback(result)
+
+        def on_error(error):
+            dialog.close()
+            errback(error)
+
+        request = self.worker.call(func, *args, callback=on_done, errback=on_error, progress=on_progress)
+        dialog.canceled.connect(lambda: self.worker.cancel(request))
 
     def export_tasks(self):
+        self.worker.call("count_archived", callback=self._export_tasks)
+
+    def _export_tasks(self, archived):
         file_path, _ = QFileDialog.getSaveFileName(self, "Сохранить отчет", "", "CSV Files (*.csv);;All Files (*)")
         if file_path:
-            try:
-                rows = self.db.get_tasks()
-                with open(file_path, mode='w', newline='', encoding='utf-8-sig') as file:
-                    writer = csv.writer(file, delimiter=';')
-                    writer.writerow(["ID", "Заголовок", "Заметки", "Дедлайн", "Статус", "Категория"])
-                    writer.writerows(rows)
-                QMessageBox.information(self, "Успех", f"Успешно сохранено в:\n{file_path}")
-            except Exception as e:
-                QMessageBox.critical(self, "Ошибка", f"Не удалось сохранить:\n{e}")
+            from csv_io import export_csv, TransferCancelled
+
+            include_archive = archived > 0 and QMessageBox.question(
+                self, "Экспорт", f"Добавить в выгрузку задачи из архива ({archived})?"
+            ) == QMessageBox.StandardButton.Yes
+
+            def on_error(error):
+                if not isinstance(error, TransferCancelled):
+                    QMessageBox.critical(self, "Ошибка", f"Не удалось сохранить:\n{error}")
+
+            self.run_with_progress(
+                "Экспорт задач...", partial(export_csv, include_archive=include_archive), file_path,
+                callback=lambda count: QMessageBox.information(
+                    self, "Успех", f"Сохранено задач: {count}\nФайл:\n{file_path}"),
+                errback=on_error)
+
+    def import_tasks(self):
+        file_path, _ = QFileDialog.getOpenFileName(self, "Загрузить задачи", "", "CSV Files (*.csv);;All Files (*)")
+        if file_path:
+            from csv_io import import_csv
+
+            def on_done(result):
+                added, skipped = result
+                self.poll_changes(force=True)
+                message = f"Добавлено задач: {added}"
+                if skipped:
+                    message += f"\nПропущено некорректных строк: {skipped}"
+                QMessageBox.information(self, "Импорт", message)
+
+            self.run_with_progress(
+                "Импорт задач...", import_csv, file_path, callback=on_done,
+                errback=lambda error: QMessageBox.critical(self, "Ошибка", f"Не удалось загрузить:\n{error}"))
+
+    def fill_snapshot_menu(self):
+        from snapshots import list_snapshots
+        menu = self.snapshot_btn.menu()
+        menu.clear()
+        action = menu.addAction("📸 Сделать снимок сейчас", self.take_snapshot)
+        action.setEnabled(not self.snapshot_worker.isRunning())
+        snapshots = list_snapshots(self.worker.db_name)
+        if snapshots:
+            menu.addSection("Восстановить")
+        for path, taken, size in snapshots:
+            menu.addAction(f"{taken:%d.%m.%Y %H:%M:%S} — {size / 2 ** 20:.1f} МБ",
+                           lambda path=path, taken=taken: self.restore_snapshot(path, taken))
+
+    def snapshot_if_due(self):
+        from snapshots import list_snapshots
+        snapshots = list_snapshots(self.worker.db_name)
+        if not snapshots or time.time() - snapshots[0][1].timestamp() >= self.SNAPSHOT_INTERVAL_H * 3600:
+            self.take_snapshot()
+
+    def take_snapshot(self):
+        # Снимок идёт в своём потоке и соединении; окно и поток базы в это время работают
+        if not self.snapshot_worker.isRunning():
+            self.snapshot_btn.setText("🛟 Снимок...")
+            self.snapshot_worker.start()
+
+    def on_snapshot_progress(self, done, total):
+        self.snapshot_btn.setText(f"🛟 Снимок {done * 100 // max(total, 1)}%")
+
+    def on_snapshot_done(self, stats):
+        from snapshots import describe_snapshot
+        self.snapshot_btn.setText("🛟 Снимки")
+        self.snapshot_btn.setToolTip(f"Последний снимок: {QTime.currentTime().toString('HH:mm')}, "
+                                     f"{describe_snapshot(stats)}")
+
+    def on_snapshot_failed(self, error):
+        self.snapshot_btn.setText("🛟 Снимки")
+        self.snapshot_btn.setToolTip(f"Снимок не удался: {error}")
+
+    def restore_snapshot(self, path, taken):
+        answer = QMessageBox.question(
+            self, "Восстановление",
+            f"Заменить все задачи и архив снимком от {taken:%d.%m.%Y %H:%M:%S}?\n"
+            "Текущее состояние перед этим сохранится отдельным снимком.")
+        if answer != QMessageBox.StandardButton.Yes:
+            return
+        from snapshots import restore_snapshot
+        self.worker.call(restore_snapshot, path, callback=self.on_restored, errback=self.show_db_error)
+
+    def on_restored(self, saved):
+        self.on_snapshot_done(saved)
+        # Журнал изменений теперь из снимка: номер берётся заново, список и категории перечитываются
+        self.change_seq = None
+        self.worker.call("get_changes", None, True, callback=self.on_changes)
+        self.update_categories()
+        self.load_tasks()
+
+    def show_db_error(self, error):
+        QMessageBox.critical(self, "Ошибка", f"Ошибка базы данных:\n{error}")
+
+    def closeEvent(self, event):
+        self.snapshot_worker.wait()
+        self.worker.stop()
+        super().closeEvent(event)
 
 
 if __name__ == '__main__':
     app = QApplication(sys.argv)
+    if "--profile" in sys.argv:
+        # Замеры включаются до открытия базы, иначе соединение останется без счётчика запросов
+        enable_profiling()
     window = ToDoApp()
+    if "--startup-report" in sys.argv:
+        window.startup_report = StartupReport(window)
+    if tracer.enabled:
+        from widgets import ProfileOverlay
+        window.profile_overlay = ProfileOverlay(window)
+        QShortcut(QKeySequence("F12"), window, window.profile_overlay.toggle)
+        window.worker.committed.connect(window.profile_overlay.show_commits)
     window.show()
     sys.exit(app.exec())
\ No newline at end of file
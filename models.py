@@ -0,0 +1,259 @@
+import bisect
+from PyQt6.QtCore import Qt, QAbstractListModel, QModelIndex, pyqtSignal
+
+TaskIdRole = Qt.ItemDataRole.UserRole
+TaskRowRole = Qt.ItemDataRole.UserRole + 1  # строка как есть: (id, title, начало заметок, deadline, status, category)
+
+
+class TaskListModel(QAbstractListModel):
+    """Модель списка задач: хранит строки из БД как есть, без виджетов на строку.
+
+    Строка — кортеж sqlite3 без преобразований; вместо заметок в нём их начало
+    (NOTES_PREVIEW_CHARS символов), целиком задачу читает TaskDatabase.get_task.
+
+    Строки подгружаются страницами: пока set_more(True), представление при
+    прокрутке к концу вызывает fetchMore, и модель просит следующую страницу
+    сигналом fetch_requested.
+
+    Рядом со списком строк хранится словарь id -> строка: по нему проверяется,
+    загружена ли задача, а её место в упорядоченном списке ищется двоичным
+    поиском по ключу сортировки прежней версии строки.
+    """
+
+    fetch_requested = pyqtSignal()
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._rows = []
+        self._records = {}
+        self._has_more = False
+        self._fetching = False
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self._rows)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid() or not 0 <= index.row() < len(self._rows):
+            return None
+
+        row = self._rows[index.row()]
+        if role == TaskRowRole:
+            return row
+        if role == TaskIdRole:
+            return row[0]
+        if role == Qt.ItemDataRole.DisplayRole:
+            return row[1]
+        return None
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and self._has_more and not self._fetching
+
+    def fetchMore(self, parent=QModelIndex()):
+        if self.canFetchMore(parent):
+            self._fetching = True
+            self.fetch_requested.emit()
+
+    def set_more(self, has_more):
+        """Отмечает, что страница загружена и есть ли за ней ещё строки"""
+        self._has_more = has_more
+        self._fetching = False
+
+    def rows(self):
+        return list(self._rows)
+
+    def set_rows(self, rows):
+        """Приводит модель к новому набору строк по id задачи.
+
+        Пропавшие строки удаляются, новые вставляются, переехавшие двигаются,
+        изменённые обновляются на месте; остальные строки (а с ними выделение
+        и позиция прокрутки) не трогаются. Возвращает число затронутых строк.
+        """
+        rows = list(rows)
+        new_ids = {row[0] for row in rows}
+        touched = self._remove_ids(self._records.keys() - new_ids)
+        return touched + self.merge_rows(rows, 0) + self.truncate(len(rows))
+
+    def _remove_ids(self, ids):
+        # Удаляем снизу вверх, объединяя соседние строки в один диапазон
+        touched = 0
+        i = len(self._rows) - 1
+        while i >= 0 and ids:
+            if self._rows[i][0] not in ids:
+                i -= 1
+                continue
+            end = i
+            while i >= 0 and self._rows[i][0] in ids:
+                i -= 1
+            touched += self._remove(i + 1, end + 1)
+        return touched
+
+    def merge_rows(self, rows, start):
+        """Выравнивает строки начиная с позиции start по порядку rows; хвост модели не удаляет.
+        Нужен для порционной загрузки, когда весь новый результат ещё неизвестен."""
+        present = self._records
+        new_pos = {row[0]: k for k, row in enumerate(rows)}
+        if len(new_pos) != len(rows):
+            raise ValueError("В порции строк повторяются id задач")
+        touched = 0
+        pos = start
+        k = 0
+        while k < len(rows):
+            row = rows[k]
+            tid = row[0]
+
+            if pos < len(self._rows) and self._rows[pos][0] == tid:
+                touched += self._update_row(pos, row)
+                pos += 1
+                k += 1
+                continue
+
+            if tid in present:
+                src = self._find(tid, pos + 1)
+                target = new_pos.get(self._rows[pos][0])
+                if src == pos + 1 and (target is None or target > k):
+                    # Сдвинулась вниз текущая строка, а не все следующие за ней. Если её нет
+                    # в этой порции, она уходит в хвост и встанет на место с одной из следующих
+                    dest = len(self._rows) if target is None else min(pos + target - k + 1, len(self._rows))
+                    self.beginMoveRows(QModelIndex(), pos, pos, QModelIndex(), dest)
+                    self._rows.insert(dest - 1, self._rows.pop(pos))
+                    self.endMoveRows()
+                    touched += 1
+                    continue
+
+                # Следующие строки порции, которые стоят сразу за найденной, едут вместе с ней:
+                # сдвинутый вниз блок обходится одним переносом, а не поиском на каждую строку
+                end = 1
+                while (k + end < len(rows) and src + end < len(self._rows)
+                       and self._rows[src + end][0] == rows[k + end][0]):
+                    end += 1
+                self.beginMoveRows(QModelIndex(), src, src + end - 1, QModelIndex(), pos)
+                moved = self._rows[src:src + end]
+                del self._rows[src:src + end]
+                self._rows[pos:pos] = moved
+                self.endMoveRows()
+                for i in range(end):
+                    self._update_row(pos + i, rows[k + i])
+                touched += end
+                pos += end
+                k += end
+                continue
+
+            # Подряд идущие новые строки вставляем одной пачкой
+            end = k
+            while end < len(rows) and rows[end][0] not in present:
+                end += 1
+            self.beginInsertRows(QModelIndex(), pos, pos + end - k - 1)
+            self._rows[pos:pos] = rows[k:end]
+            self._records.update((row[0], row) for row in rows[k:end])
+            self.endInsertRows()
+            touched += end - k
+            pos += end - k
+            k = end
+
+        return touched
+
+    def apply_changes(self, rows, removed_ids, sort_key, last_key=None):
+        """Точечно применяет изменения задач к упорядоченному по sort_key списку.
+
+        rows — новые версии изменённых задач, removed_ids — задачи, которых в списке
+        быть не должно. Если загружена только часть списка (last_key — ключ последней
+        загруженной строки), строки дальше неё не показываются: они придут со следующими
+        страницами. Остальные строки и выделение не трогаются. Возвращает число затронутых строк.
+        """
+        touched = 0
+        removed_ids = set(removed_ids)
+        if last_key is not None:
+            removed_ids.update(row[0] for row in rows if sort_key(row) > last_key)
+            rows = [row for row in rows if sort_key(row) <= last_key]
+        touched += self._remove_ids(removed_ids & self._records.keys())
+
+        rows = sorted(rows, key=sort_key)
+        k = 0
+        while k < len(rows):
+            row = rows[k]
+            k += 1
+            target = bisect.bisect_left(self._rows, sort_key(row), key=sort_key)
+            if row[0] not in self._records:
+                # Новые строки, которые встают на одно место, вставляем одной пачкой
+                end = k
+                while (end < len(rows) and rows[end][0] not in self._records
+                       and bisect.bisect_left(self._rows, sort_key(rows[end]), key=sort_key) == target):
+                    end += 1
+                self.beginInsertRows(QModelIndex(), target, target + end - k)
+                self._rows[target:target] = rows[k - 1:end]
+                self._records.update((row[0], row) for row in rows[k - 1:end])
+                self.endInsertRows()
+                touched += end - k + 1
+                k = end
+                continue
+
+            # Строка уже есть: двигаем её, а не удаляем и вставляем, чтобы не терять выделение
+            pos = self._locate(self._records[row[0]], sort_key)
+            if target > pos:
+                target -= 1  # место считается в списке без этой строки
+            if target != pos:
+                self.beginMoveRows(QModelIndex(), pos, pos, QModelIndex(), target + 1 if target > pos else target)
+                self._rows.insert(target, self._rows.pop(pos))
+                self.endMoveRows()
+                self._update_row(target, row)
+                touched += 1
+            else:
+                touched += self._update_row(pos, row)
+        return touched
+
+    def append_rows(self, rows):
+        if not rows:
+            return 0
+        ids = {row[0] for row in rows}
+        if len(ids) != len(rows) or not ids.isdisjoint(self._records):
+            # Страница пришла второй раз: молча добавленные дубли сломали бы словарь строк
+            raise ValueError("Добавляемые строки повторяют уже загруженные id")
+        start = len(self._rows)
+        self.beginInsertRows(QModelIndex(), start, start + len(rows) - 1)
+        self._rows += rows
+        self._records.update((row[0], row) for row in rows)
+        self.endInsertRows()
+        return len(rows)
+
+    def truncate(self, count):
+        return self._remove(count, len(self._rows))
+
+    def clear(self):
+        self.beginResetModel()
+        self._rows = []
+        self._records = {}
+        self.endResetModel()
+
+    def _remove(self, start, end):
+        if start >= end:
+            return 0
+        self.beginRemoveRows(QModelIndex(), start, end - 1)
+        for row in self._rows[start:end]:
+            del self._records[row[0]]
+        del self._rows[start:end]
+        self.endRemoveRows()
+        return end - start
+
+    def _locate(self, row, sort_key):
+        """Место загруженной строки row в упорядоченном по sort_key списке"""
+        pos = bisect.bisect_left(self._rows, sort_key(row), key=sort_key)
+        if pos < len(self._rows) and self._rows[pos][0] == row[0]:
+            return pos
+        return self._find(row[0], 0)  # порядок нарушен (например, строки до смены дня)
+
+    def _find(self, tid, start):
+        for i in range(start, len(self._rows)):
+            if self._rows[i][0] == tid:
+                return i
+        return -1
+
+    def _update_row(self, pos, row):
+        if self._rows[pos] == row:
+            return 0
+        self._rows[pos] = row
+        self._records[row[0]] = row
+        index = self.index(pos)
+        self.dataChanged.emit(index, index)
+        return 1
@@ -0,0 +1,170 @@
+"""Необязательные замеры горячих путей.
+
+Интервалы (@timed) вокруг методов базы и интерфейса, число SQL-запросов и коммитов
+в каждом интервале, журнал медленных запросов с планом (EXPLAIN QUERY PLAN).
+Включаются enable() до открытия базы (флаг --profile у main.py и cli.py); пока
+замеры выключены, обёртка стоит одну проверку флага на вызов, а соединение
+работает без обработчика трассировки.
+
+Трасса сохраняется в формате Chrome trace (chrome://tracing, ui.perfetto.dev).
+"""
+import json
+import threading
+import time
+from collections import deque
+from functools import wraps
+
+SLOW_QUERY_MS = 50
+TRACE_EVENTS = 20000
+SLOW_LOG_SIZE = 50
+PLAN_SKIP = ("BEGIN", "COMMIT", "ROLLBACK", "PRAGMA", "ATTACH", "CREATE", "DROP", "EXPLAIN", "VACUUM", "ANALYZE")
+
+
+class Tracer:
+    def __init__(self):
+        self.enabled = False
+        self.t0 = time.perf_counter()
+        self.totals = {}  # имя -> [вызовов, всего мс, максимум мс, запросов, коммитов]
+        self.events = deque(maxlen=TRACE_EVENTS)
+        self.slow_queries = deque(maxlen=SLOW_LOG_SIZE)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def reset(self):
+        with self._lock:
+            self.totals.clear()
+            self.events.clear()
+            self.slow_queries.clear()
+
+    def _thread(self):
+        local = self._local
+        if not hasattr(local, "depth"):
+            local.depth = 0
+            local.sql = 0
+            local.commits = 0
+            local.statement = None  # (текст, начало) выполняемого запроса
+            local.pending = []  # медленные запросы, которым ещё нужен план
+            local.conn = None
+            local.explaining = False
+        return local
+
+    def attach(self, conn):
+        """Считает запросы соединения; вызывается в потоке, который им владеет"""
+        local = self._thread()
+        local.conn = conn
+
+        def on_statement(sql):
+            # Внутренние запросы FTS5 приходят с префиксом «-- », а шаги триггеров — текстом
+            # самого запроса; и то и другое — часть выполняемого запроса
+            if local.explaining or sql.startswith("--") or (local.statement and local.statement[0] == sql):
+                return
+            now = time.perf_counter()
+            self._close_statement(local, now)
+            local.statement = (sql, now)
+            local.sql += 1
+            if sql == "COMMIT":
+                local.commits += 1
+
+        conn.set_trace_callback(on_statement)
+
+    def _close_statement(self, local, now):
+        if local.statement:
+            sql, start = local.statement
+            duration = (now - start) * 1000
+            if duration >= SLOW_QUERY_MS:
+                local.pending.append((sql, duration))
+            local.statement = None
+
+    def _explain(self, local, span):
+        local.explaining = True
+        try:
+            for sql, duration in local.pending:
+                plan = []
+                if local.conn and not sql.lstrip().upper().startswith(PLAN_SKIP):
+                    try:
+                        plan = [row[3] for row in local.conn.execute("EXPLAIN QUERY PLAN " + sql)]
+                    except Exception as e:
+                        plan = [f"план недоступен: {e}"]
+                self.slow_queries.append({"span": span, "ms": round(duration, 2), "sql": sql, "plan": plan})
+        finally:
+            local.explaining = False
+            local.pending = []
+
+    def add(self, name, start, end=None, sql=0, commits=0):
+        """Записывает интервал, замеренный вручную (например, загрузку, идущую через несколько вызовов)"""
+        end = end or time.perf_counter()
+        duration = (end - start) * 1000
+        with self._lock:
+            total = self.totals.setdefault(name, [0, 0.0, 0.0, 0, 0])
+            total[0] += 1
+            total[1] += duration
+            total[2] = max(total[2], duration)
+            total[3] += sql
+            total[4] += commits
+            self.events.append((name, start, duration, threading.get_ident(), sql, commits))
+
+    def call(self, name, func, *args, **kwargs):
+        local = self._thread()
+        local.depth += 1
+        sql, commits = local.sql, local.commits
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            end = time.perf_counter()
+            local.depth -= 1
+            if local.depth == 0:
+                self._close_statement(local, end)
+            self.add(name, start, end, local.sql - sql, local.commits - commits)
+            if local.depth == 0 and local.pending:
+                self._explain(local, name)
+
+    def summary_lines(self, limit=15):
+        """Самые затратные интервалы по суммарному времени и последние медленные запросы"""
+        with self._lock:
+            totals = sorted(self.totals.items(), key=lambda item: -item[1][1])[:limit]
+            slow = list(self.slow_queries)[-5:]
+        lines = [f"{'интервал':<36} {'раз':>6} {'всего мс':>9} {'макс мс':>8} {'SQL/раз':>7} {'коммитов':>8}"]
+        for name, (calls, total, longest, sql, commits) in totals:
+            lines.append(f"{name[-36:]:<36} {calls:>6} {total:>9.1f} {longest:>8.1f} {sql / calls:>7.1f} {commits:>8}")
+        if slow:
+            lines.append("")
+            lines.append(f"медленные запросы (от {SLOW_QUERY_MS} мс):")
+            for query in slow:
+                lines.append(f"  {query['ms']:.1f} мс в {query['span']}: {' '.join(query['sql'].split())[:100]}")
+                lines.extend(f"    {step}" for step in query["plan"])
+        return lines
+
+    def save_trace(self, path):
+        with self._lock:
+            events = list(self.events)
+            slow = list(self.slow_queries)
+        trace = {
+            "traceEvents": [
+                {"name": name, "ph": "X", "pid": 1, "tid": tid,
+                 "ts": round((start - self.t0) * 1e6), "dur": round(duration * 1000),
+                 "args": {"sql": sql, "commits": commits}}
+                for name, start, duration, tid, sql, commits in events],
+            "slowQueries": slow,
+        }
+        with open(path, "w", encoding="utf-8") as file:
+            json.dump(trace, file, ensure_ascii=False)
+
+
+tracer = Tracer()
+
+
+def enable():
+    tracer.enabled = True
+
+
+def timed(func):
+    """Интервал вокруг функции под именем Класс.метод"""
+    name = func.__qualname__
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        if not tracer.enabled:
+            return func(*args, **kwargs)
+        return tracer.call(name, func, *args, **kwargs)
+    return wrapper
@@ -0,0 +1,168 @@
+"""Снимки базы: копии основной базы и архива через backup API SQLite.
+
+Снимок снимается в своём соединении, поэтому поток базы в это время отвечает
+окну. Копирование идёт шагами по SNAPSHOT_PAGES страниц внутри одной читающей
+транзакции: в режиме WAL она не мешает записи, а снимок получается на один
+момент и не начинается заново от каждой записи другого соединения.
+
+Снимки лежат в каталоге snapshots рядом с базой под именами вида
+tasks_v2-20261018-153000-123456.sqlite (и _archive.sqlite рядом), хранятся
+SNAPSHOT_KEEP последних.
+"""
+import os
+import re
+import sqlite3
+import time
+from datetime import datetime
+from urllib.parse import quote
+
+from database import archive_name
+from profiling import timed
+
+SNAPSHOT_DIR = "snapshots"
+SNAPSHOT_KEEP = 10
+SNAPSHOT_PAGES = 1024  # страниц за шаг; между шагами обновляется прогресс
+STAMP_FORMAT = "%Y%m%d-%H%M%S-%f"
+
+
+def snapshot_dir(db_name):
+    return os.path.join(os.path.dirname(os.path.abspath(db_name)), SNAPSHOT_DIR)
+
+
+def _stem(db_name):
+    return re.sub(r"\.sqlite$", "", os.path.basename(db_name))
+
+
+def list_snapshots(db_name, directory=None):
+    """Снимки базы от новых к старым: (путь, время снимка, размер в байтах с архивом)"""
+    directory = directory or snapshot_dir(db_name)
+    pattern = re.compile(re.escape(_stem(db_name)) + r"-(\d{8}-\d{6}-\d{6})\.sqlite$")
+    snapshots = []
+    if os.path.isdir(directory):
+        for name in os.listdir(directory):
+            match = pattern.match(name)
+            if not match:
+                continue
+            path = os.path.join(directory, name)
+            size = os.path.getsize(path)
+            if os.path.exists(archive_name(path)):
+                size += os.path.getsize(archive_name(path))
+            snapshots.append((path, datetime.strptime(match.group(1), STAMP_FORMAT), size))
+    return sorted(snapshots, key=lambda snapshot: snapshot[1], reverse=True)
+
+
+def _open_readonly(path):
+    # mode=ro: отсутствующий файл — ошибка, а не новая пустая база
+    return sqlite3.connect(f"file:{quote(os.path.abspath(path))}?mode=ro", uri=True)
+
+
+def rotate_snapshots(db_name, keep=SNAPSHOT_KEEP, directory=None, exclude=()):
+    """Удаляет снимки старше keep последних, кроме путей из exclude; возвращает число удалённых"""
+    exclude = {os.path.abspath(path) for path in exclude}
+    old = [snapshot for snapshot in list_snapshots(db_name, directory)[keep:]
+           if os.path.abspath(snapshot[0]) not in exclude]
+    for path, _, _ in old:
+        for file in (archive_name(path), path):
+            if os.path.exists(file):
+                os.remove(file)
+    return len(old)
+
+
+@timed
+def take_snapshot(db_name, directory=None, keep=SNAPSHOT_KEEP, pages=SNAPSHOT_PAGES, progress=None, exclude=()):
+    """Снимает базу и её архив; возвращает статистику снимка (путь, страницы, байты, секунды, МБ/с).
+
+    progress(done, total) получает число скопированных страниц; снимки из exclude
+    ротация не удаляет. Файлы снимка
+    пишутся под временными именами и переименовываются в конце, поэтому в списке
+    снимков недописанных не бывает.
+    """
+    directory = directory or snapshot_dir(db_name)
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{_stem(db_name)}-{datetime.now().strftime(STAMP_FORMAT)}.sqlite")
+
+    start = time.perf_counter()
+    source = sqlite3.connect(db_name)
+    try:
+        source.execute("ATTACH DATABASE ? AS archive", (archive_name(db_name),))
+        # Одна читающая транзакция на обе базы: дальше шаги копируют её состояние
+        source.execute("BEGIN")
+        counts = {schema: source.execute(f"PRAGMA {schema}.page_count").fetchone()[0] for schema in ("main", "archive")}
+        page_size = source.execute("PRAGMA page_size").fetchone()[0]
+        total = sum(counts.values())
+
+        copied = 0
+        for schema, target_path in (("main", path), ("archive", archive_name(path))):
+            def report(status, remaining, schema_total, offset=copied):
+                if progress:
+                    progress(offset + schema_total - remaining, total)
+
+            target = sqlite3.connect(target_path + ".tmp")
+            try:
+                source.backup(target, pages=pages, progress=report, name=schema, sleep=0)
+            finally:
+                target.close()
+            copied += counts[schema]
+        source.rollback()
+    except BaseException:
+        for file in (path + ".tmp", archive_name(path) + ".tmp"):
+            if os.path.exists(file):
+                os.remove(file)
+        raise
+    finally:
+        source.close()
+
+    # Архив первым: снимок виден в списке, только когда у него уже есть архив
+    os.replace(archive_name(path) + ".tmp", archive_name(path))
+    os.replace(path + ".tmp", path)
+    seconds = time.perf_counter() - start
+    rotate_snapshots(db_name, keep, directory, exclude)
+
+    size = total * page_size
+    return {"path": path, "pages": total, "bytes": size, "seconds": seconds,
+            "mb_per_s": size / 2 ** 20 / seconds if seconds else 0.0}
+
+
+def describe_snapshot(stats):
+    return (f"{stats['bytes'] / 2 ** 20:.1f} МБ за {stats['seconds']:.2f} с "
+            f"({stats['mb_per_s']:.1f} МБ/с)")
+
+
+@timed
+def restore_snapshot(db, path):
+    """Заменяет содержимое базы и архива снимком path; выполняется в потоке базы (worker.call).
+
+    Текущее состояние перед этим само сохраняется снимком, так что восстановление
+    можно отменить, восстановив его. Возвращает статистику этого снимка.
+    """
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Нет снимка {path}")
+    db.flush()
+    last_seq = db.conn.execute("SELECT IFNULL(max(seq), 0) FROM task_changes").fetchone()[0]
+
+    # Источники открываются до страховочного снимка, а его ротация не трогает
+    # восстанавливаемый: иначе самый старый снимок удалялся бы прямо перед копированием
+    sources = [(_open_readonly(path), db.conn)]
+    try:
+        if os.path.exists(archive_name(path)):
+            sources.append((_open_readonly(archive_name(path)), sqlite3.connect(archive_name(db.db_name))))
+        saved = take_snapshot(db.db_name, exclude=(path,))
+        for source, target in sources:
+            source.backup(target)
+    finally:
+        for source, target in sources:
+            source.close()
+            if target is not db.conn:
+                target.close()
+
+    db.init_db()  # снимок мог быть сделан до последних миграций
+    db.load_categories()
+    # Журнал изменений пришёл из снимка со старыми номерами. Запись без задачи после
+    # прежнего последнего номера велит другим окнам перечитать список, а новые
+    # записи не повторят номера, которые они уже видели
+    with db.transaction():
+        db.cursor.execute("""INSERT INTO task_changes (seq, task_id)
+            SELECT max(?, IFNULL(max(seq), 0)) + 1, NULL FROM task_changes""", (last_seq,))
+    db.flush()
+    db.data_version = None
+    return saved
@@ -0,0 +1,69 @@
+from PyQt6.QtGui import QColor
+from database import STATUS_DONE, STATUS_OVERDUE, STATUS_PENDING
+
+# Цвета темы. Из них один раз собираются таблица стилей приложения и QColor для делегата,
+# так что переключение темы не разбирает строки цветов заново
+LIGHT = {
+    "window": "#f0f2f5", "text": "#000000", "dialog": "#ffffff",
+    "input": "white", "input_text": "black", "input_border": "#ccc",
+    "button": "#e0e0e0", "button_text": "#000000", "button_border": "#ccc", "button_hover": "#d0d0d0",
+    "accent": "#007bff", "danger": "#dc3545", "label": "#000000",
+    "card_text": "black", "card_subtext": "#666666", "selection": "#4a90e2",
+    "cards": {
+        STATUS_PENDING: ("#ffffff", "#cccccc"),
+        STATUS_DONE: ("#d1e7dd", "#badbcc"),
+        STATUS_OVERDUE: ("#f8d7da", "#f5c6cb"),
+    },
+}
+
+DARK = {
+    "window": "#121212", "text": "#ffffff", "dialog": "#1e1e1e",
+    "input": "#2d2d2d", "input_text": "#e0e0e0", "input_border": "#444",
+    "button": "#333333", "button_text": "#e0e0e0", "button_border": "#444", "button_hover": "#444444",
+    "accent": "#007bff", "danger": "#61131a", "label": "#e0e0e0",
+    "card_text": "#e0e0e0", "card_subtext": "#aaaaaa", "selection": "#4a90e2",
+    "cards": {
+        STATUS_PENDING: ("#2d2d2d", "#444444"),
+        STATUS_DONE: ("#1e3a2a", "#2f5c40"),
+        STATUS_OVERDUE: ("#4a1e1e", "#6b2b2b"),
+    },
+}
+
+# Кнопки и заголовок выбираются по objectName, чтобы не вешать на них отдельные таблицы стилей
+STYLESHEET = """
+    QWidget {{ background-color: {window}; color: {text}; }}
+    QLineEdit, QTextEdit, QComboBox, QDateEdit {{
+        background-color: {input}; color: {input_text}; border: 1px solid {input_border}; border-radius: 5px; padding: 5px;
+    }}
+    QListView {{ background: transparent; border: none; outline: 0; }}
+    QPushButton {{
+        background-color: {button}; color: {button_text}; border: 1px solid {button_border}; border-radius: 5px; padding: 5px;
+    }}
+    QPushButton:hover {{ background-color: {button_hover}; }}
+    QPushButton#addButton {{
+        background-color: {accent}; color: white; font-weight: bold; padding: 12px; border-radius: 8px; border: none;
+    }}
+    QPushButton#removeButton {{ background-color: {danger}; color: white; padding: 8px; border-radius: 5px; border: none; }}
+    QDialog, QMessageBox {{ background-color: {dialog}; }}
+    QLabel {{ color: {label}; background-color: transparent; }}
+    QLabel#titleLabel {{ font-size: 22px; font-weight: bold; margin: 10px; }}
+"""
+
+
+class Theme:
+    """Готовая тема: таблица стилей приложения и цвета для отрисовки карточек"""
+
+    def __init__(self, colors):
+        self.stylesheet = STYLESHEET.format(**colors)
+        self.text = QColor(colors["card_text"])
+        self.subtext = QColor(colors["card_subtext"])
+        self.selection = QColor(colors["selection"])
+        self.cards = {status: (QColor(bg), QColor(border)) for status, (bg, border) in colors["cards"].items()}
+
+    def card_colors(self, status):
+        """(фон, рамка) карточки для статуса"""
+        return self.cards.get(status, self.cards[STATUS_PENDING])
+
+
+LIGHT_THEME = Theme(LIGHT)
+DARK_THEME = Theme(DARK)
@@ -1,88 +1,191 @@
-from PyQt6.QtWidgets import QFrame, QVBoxLayout, QLabel
-from database import STATUS_DONE, STATUS_OVERDUE
+from PyQt6.QtWidgets import (QStyledItemDelegate, QStyle, QWidget, QLabel, QPushButton, QVBoxLayout,
+                             QHBoxLayout, QFileDialog)
+from PyQt6.QtCore import Qt, QSize, QRectF, QRect, QTimer
+from PyQt6.QtGui import QColor, QPen, QFont, QFontMetrics, QPainter, QFontDatabase
+from database import STATUS_DONE, STATUS_OVERDUE, describe_commits
+from models import TaskRowRole
+from profiling import tracer, timed
 
 
-class TaskWidget(QFrame):
+class TaskDelegate(QStyledItemDelegate):
+    """Рисует карточку задачи прямо в списке: стоимость есть только у видимых строк"""
 
-    def __init__(self, title, notes, deadline, status, category, is_selected=False, is_dark_mode=False, parent=None):
+    MARGIN = 11
+    SPACING = 6
+
+    def __init__(self, theme, parent=None):
         super().__init__(parent)
-        self.layout = QVBoxLayout(self)
-        self.setFrameShape(QFrame.Shape.StyledPanel)
+        self.theme = theme
+
+    def set_theme(self, theme):
+        self.theme = theme
+
+    def card_style(self, status, is_selected):
+        bg_color, border_color = self.theme.card_colors(status)
+        if is_selected:
+            return bg_color, self.theme.selection, 2
+        return bg_color, border_color, 1
+
+    @staticmethod
+    def _fonts(base_font):
+        title_font = QFont(base_font)
+        title_font.setBold(True)
+        category_font = QFont(base_font)
+        category_font.setItalic(True)
+        category_font.setPixelSize(11)
+        return title_font, category_font
+
+    def sizeHint(self, option, index):
+        title_font, category_font = self._fonts(option.font)
+        line = QFontMetrics(option.font).height()
+        height = (2 * self.MARGIN + 3 * self.SPACING + QFontMetrics(title_font).height()
+                  + QFontMetrics(category_font).height() + 2 * line)
+        return QSize(option.rect.width(), height)
+
+    @timed
+    def paint(self, painter, option, index):
+        row = index.data(TaskRowRole)
+        if row is None:
+            return
+
+        _, title, notes, deadline, status, category = row
+        is_selected = bool(option.state & QStyle.StateFlag.State_Selected)
+        bg_color, border_color, border_width = self.card_style(status, is_selected)
+        text_color = self.theme.text
+        subtext_color = self.theme.subtext
+
+        painter.save()
+        painter.setRenderHint(QPainter.RenderHint.Antialiasing)
+
+        half = border_width / 2
+        card = QRectF(option.rect).adjusted(half, half, -half, -half)
+        painter.setPen(QPen(border_color, border_width))
+        painter.setBrush(bg_color)
+        painter.drawRoundedRect(card, 8, 8)
 
-        # Сохраняем параметры для обновления стиля
-        self.current_status = status
-        self.is_selected = is_selected
-        self.is_dark_mode = is_dark_mode
+        icon = "✅" if status == STATUS_DONE else ("❌" if status == STATUS_OVERDUE else "⏳")
+        note_text = notes.split('\n')[0][:35] + "..." if notes else "заметок нет"
 
-        self.title_label = QLabel()
-        self.category_label = QLabel()
-        self.deadline_label = QLabel()
-        self.notes_label = QLabel()
+        title_font, category_font = self._fonts(option.font)
+        lines = [
+            (title_font, text_color, f"{icon} {title}"),
+            (category_font, subtext_color, f"📁 {category or 'Без категории'}"),
+            (option.font, text_color, f"📅 Срок: {deadline}"),
+            (option.font, text_color, f"📝 {note_text}"),
+        ]
 
-        self.layout.addWidget(self.title_label)
-        self.layout.addWidget(self.category_label)
-        self.layout.addWidget(self.deadline_label)
-        self.layout.addWidget(self.notes_label)
+        x = option.rect.x() + self.MARGIN
+        y = option.rect.y() + self.MARGIN
+        width = option.rect.width() - 2 * self.MARGIN
+        for font, color, text in lines:
+            metrics = QFontMetrics(font)
+            painter.setFont(font)
+            painter.setPen(color)
+            painter.drawText(x, y, width, metrics.height(), Qt.AlignmentFlag.AlignLeft | Qt.AlignmentFlag.AlignVCenter,
+                             metrics.elidedText(text, Qt.TextElideMode.ElideRight, width))
+            y += metrics.height() + self.SPACING
 
-        self.update_content(title, notes, deadline, status, category, is_selected, is_dark_mode)
+        painter.restore()
 
-    def update_content(self, title, notes, deadline, status, category, is_selected, is_dark_mode):
-        self.current_status = status
-        self.is_selected = is_selected
-        self.is_dark_mode = is_dark_mode
 
-        icon = "✅" if status == STATUS_DONE else ("❌" if status == STATUS_OVERDUE else "⏳")
+class ThroughputChart(QWidget):
+    """Столбики «создано» и «выполнено» по дням из TaskDatabase.get_history"""
 
-        text_color = "#e0e0e0" if is_dark_mode else "black"
-        subtext_color = "#aaaaaa" if is_dark_mode else "#666666"
-
-        self.title_label.setText(f"<b>{icon} {title}</b>")
-        self.title_label.setStyleSheet(f"color: {text_color};")
-
-        self.category_label.setText(f"<i>📁 {category}</i>")
-        self.category_label.setStyleSheet(f"color: {subtext_color}; font-size: 11px;")
-
-        self.deadline_label.setText(f"📅 Срок: {deadline}")
-        self.deadline_label.setStyleSheet(f"color: {text_color};")
-
-        note_text = notes.strip().split('\n')[0][:35] + "..." if notes else "заметок нет"
-        self.notes_label.setText(f"📝 {note_text}")
-        self.notes_label.setStyleSheet(f"color: {text_color};")
-
-        self.update_style()
-
-    def set_theme(self, is_dark):
-        self.is_dark_mode = is_dark
-        # Обновляем цвета текста
-        text_color = "#e0e0e0" if is_dark else "black"
-        subtext_color = "#aaaaaa" if is_dark else "#666666"
-
-        self.title_label.setStyleSheet(f"color: {text_color};")
-        self.category_label.setStyleSheet(f"color: {subtext_color}; font-size: 11px;")
-        self.deadline_label.setStyleSheet(f"color: {text_color};")
-        self.notes_label.setStyleSheet(f"color: {text_color};")
-
-        self.update_style()
-
-    def update_style(self):
-        if self.current_status == STATUS_DONE:
-            bg_color = "#1e3a2a" if self.is_dark_mode else "#d1e7dd"
-            border_base = "#2f5c40" if self.is_dark_mode else "#badbcc"
-        elif self.current_status == STATUS_OVERDUE:
-            bg_color = "#4a1e1e" if self.is_dark_mode else "#f8d7da"
-            border_base = "#6b2b2b" if self.is_dark_mode else "#f5c6cb"
-        else:
-            bg_color = "#2d2d2d" if self.is_dark_mode else "#ffffff"
-            border_base = "#444444" if self.is_dark_mode else "#cccccc"
-
-        border_color = "#4a90e2" if self.is_selected else border_base
-        border_width = "2px" if self.is_selected else "1px"
-
-        self.setStyleSheet(f"""
-            TaskWidget {{
-                background-color: {bg_color};
-                border: {border_width} solid {border_color};
-                border-radius: 8px;
-            }}
-            QLabel {{ background: transparent; }}
-        """)
\ No newline at end of file
+    CREATED_COLOR = "#4a90e2"
+    COMPLETED_COLOR = "#5cb85c"
+
+    def __init__(self, history, parent=None):
+        super().__init__(parent)
+        self.history = history
+        self.setMinimumHeight(140)
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        metrics = painter.fontMetrics()
+        legend_height = metrics.height() + 4
+        axis_height = metrics.height() + 2
+        area = self.rect().adjusted(4, legend_height, -4, -axis_height)
+
+        x = 4
+        for color, label in ((self.CREATED_COLOR, "создано"), (self.COMPLETED_COLOR, "выполнено")):
+            painter.fillRect(x, 3, 10, 10, QColor(color))
+            painter.drawText(x + 14, metrics.ascent(), label)
+            x += 24 + metrics.horizontalAdvance(label)
+
+        if not self.history or area.height() <= 0:
+            return
+
+        peak = max(max(created, completed) for _, created, completed in self.history) or 1
+        slot = area.width() / len(self.history)
+        bar = max(1, int(slot / 2) - 1)
+        for i, (day, created, completed) in enumerate(self.history):
+            left = area.left() + int(i * slot)
+            for offset, value, color in ((0, created, self.CREATED_COLOR), (bar, completed, self.COMPLETED_COLOR)):
+                height = int(area.height() * value / peak)
+                painter.fillRect(left + offset, area.bottom() - height, bar, height, QColor(color))
+            # Подписываем каждый второй день, считая от сегодняшнего
+            if (len(self.history) - 1 - i) % 2 == 0:
+                painter.drawText(QRect(left - 10, area.bottom() + 2, int(slot) + 20, axis_height),
+                                 Qt.AlignmentFlag.AlignHCenter, day[8:])
+
+
+class ProfileOverlay(QWidget):
+    """Окно разработчика с замерами profiling: обновляется, пока открыто"""
+
+    REFRESH_MS = 500
+
+    def __init__(self, parent=None):
+        super().__init__(parent, Qt.WindowType.Tool)
+        self.setWindowTitle("Замеры")
+        self.resize(640, 420)
+
+        self.label = QLabel()
+        self.label.setFont(QFontDatabase.systemFont(QFontDatabase.SystemFont.FixedFont))
+        self.label.setAlignment(Qt.AlignmentFlag.AlignTop | Qt.AlignmentFlag.AlignLeft)
+        self.label.setTextInteractionFlags(Qt.TextInteractionFlag.TextSelectableByMouse)
+        self.commit_stats = None
+
+        reset_btn = QPushButton("Сбросить")
+        save_btn = QPushButton("💾 Трасса...")
+        reset_btn.clicked.connect(tracer.reset)
+        save_btn.clicked.connect(self.save_trace)
+
+        buttons = QHBoxLayout()
+        buttons.addWidget(reset_btn)
+        buttons.addWidget(save_btn)
+        layout = QVBoxLayout(self)
+        layout.addWidget(self.label, 1)
+        layout.addLayout(buttons)
+
+        self.timer = QTimer(self)
+        self.timer.setInterval(self.REFRESH_MS)
+        self.timer.timeout.connect(self.refresh)
+
+    def toggle(self):
+        self.setVisible(not self.isVisible())
+
+    def showEvent(self, event):
+        self.refresh()
+        self.timer.start()
+        super().showEvent(event)
+
+    def hideEvent(self, event):
+        self.timer.stop()
+        super().hideEvent(event)
+
+    def show_commits(self, elapsed, stats):
+        """Слот для DatabaseWorker.committed"""
+        self.commit_stats = stats
+        if self.isVisible():
+            self.refresh()
+
+    def refresh(self):
+        lines = tracer.summary_lines()
+        if self.commit_stats:
+            lines = [describe_commits(self.commit_stats), ""] + lines
+        self.label.setText("\n".join(lines))
+
+    def save_trace(self):
+        path, _ = QFileDialog.getSaveFileName(self, "Сохранить трассу", "trace.json", "JSON (*.json)")
+        if path:
+            tracer.save_trace(path)
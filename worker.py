@@ -0,0 +1,187 @@
+import queue
+from PyQt6.QtCore import QThread, pyqtSignal
+from database import TaskDatabase, PAGE_SIZE
+from profiling import timed
+
+
+class DatabaseWorker(QThread):
+    """Поток, который владеет соединением с базой.
+
+    Запросы ставятся в очередь и выполняются строго по порядку, результаты
+    возвращаются в поток интерфейса сигналами. Загрузка списка помечается
+    номером поколения: запросы, которые успели устареть, пропускаются или
+    прерываются между порциями строк.
+    """
+
+    CHUNK_SIZE = 1000
+
+    result_ready = pyqtSignal(int, object)  # номер запроса, результат
+    failed = pyqtSignal(int, object)  # номер запроса, исключение
+    progress = pyqtSignal(int, int, int)  # номер запроса, сделано, всего
+    rows_ready = pyqtSignal(int, list, bool, object)  # поколение, порция строк, последняя ли порция, ключ продолжения
+    error = pyqtSignal(object)  # исключения, для которых не передан errback
+    committed = pyqtSignal(float, dict)  # время последнего коммита в мс, TaskDatabase.commit_stats
+
+    def __init__(self, db_name="tasks_v2.sqlite", group_commit_ms=0, parent=None):
+        super().__init__(parent)
+        self.db_name = db_name
+        self.group_commit_ms = group_commit_ms
+        self._queue = queue.Queue()
+        self._request_id = 0
+        self._generation = 0
+        self._callbacks = {}
+        self._progress_callbacks = {}
+        self._cancelled = set()
+
+        self.result_ready.connect(self._deliver)
+        self.failed.connect(self._deliver_error)
+        self.progress.connect(self._deliver_progress)
+
+    def call(self, method, *args, callback=None, errback=None, progress=None):
+        """Выполняет в потоке базы метод TaskDatabase (по имени) или функцию вида func(db, *args).
+        callback, errback (получает исключение) и progress вызываются в потоке интерфейса.
+
+        Если передан progress, функция получает именованный аргумент progress(done, total);
+        он возвращает False, когда запрос отменён через cancel().
+        """
+        self._request_id += 1
+        self._callbacks[self._request_id] = (callback, errback)
+        if progress:
+            self._progress_callbacks[self._request_id] = progress
+        self._queue.put(("call", self._request_id, method, args, progress is not None))
+        return self._request_id
+
+    def cancel(self, request_id):
+        self._cancelled.add(request_id)
+
+    def load_tasks(self, category_filter=None, status_filter=None, search_text=None, after=None, limit=PAGE_SIZE):
+        """Запрашивает до limit строк списка после ключа after; строки придут порциями через rows_ready.
+
+        Запрос с начала списка (after=None) открывает новое поколение, продолжение
+        относится к текущему. Возвращает поколение.
+        """
+        if after is None:
+            self._generation += 1
+        self._queue.put(("tasks", self._generation, (category_filter, status_filter, search_text), after, limit))
+        return self._generation
+
+    def stop(self):
+        self._queue.put(None)
+        self.wait()
+
+    def run(self):
+        try:
+            db = TaskDatabase(self.db_name)
+            db.prune_changes()
+            db.set_group_commit(self.group_commit_ms)
+        except Exception as e:
+            self.failed.emit(0, e)
+            return
+
+        held = []  # ответы на записи, которые ждут группового коммита
+        while True:
+            try:
+                request = self._queue.get(timeout=db.flush_due())
+            except queue.Empty:
+                self._flush(db, held)
+                continue
+            if request is None:
+                break
+
+            kind, number, payload = request[0], request[1], request[2:]
+            try:
+                if kind == "tasks":
+                    self._stream_tasks(db, number, *payload)
+                else:
+                    method, args, with_progress = payload
+                    func = getattr(db, method) if isinstance(method, str) else lambda *a, **kw: method(db, *a, **kw)
+                    kwargs = {"progress": self._reporter(number)} if with_progress else {}
+                    writes = db.pending_writes
+                    result = func(*args, **kwargs)
+                    if db.pending_writes > writes:
+                        held.append((number, result))
+                    else:
+                        self.result_ready.emit(number, result)
+                    if held and db.flush_due() is None:
+                        self._flush(db, held)  # вызов сам зафиксировал записи (maintain, восстановление)
+            except Exception as e:
+                self.failed.emit(number if kind == "call" else 0, e)
+
+        self._flush(db, held)
+        db.conn.close()
+
+    def _flush(self, db, held):
+        """Групповой коммит; ответы на вошедшие в него записи уходят только после него,
+        поэтому callback записи означает, что она уже на диске"""
+        try:
+            elapsed = db.flush()
+        except Exception as e:
+            for number, _ in held:
+                self.failed.emit(number, e)
+        else:
+            if elapsed:
+                self.committed.emit(elapsed, dict(db.commit_stats))
+            for number, result in held:
+                self.result_ready.emit(number, result)
+        held.clear()
+
+    def _reporter(self, request_id):
+        def report(done, total):
+            self.progress.emit(request_id, done, total)
+            return request_id not in self._cancelled
+        return report
+
+    @timed
+    def _stream_tasks(self, db, generation, filters, after, limit):
+        left = limit
+        while left > 0:
+            if generation != self._generation:
+                return
+            rows, after = db.get_task_page(*filters, after=after, limit=min(left, self.CHUNK_SIZE), preview=True)
+            left -= len(rows)
+            if after is None or left <= 0:
+                self.rows_ready.emit(generation, rows, True, after)
+                return
+            self.rows_ready.emit(generation, rows, False, after)
+
+    def _deliver(self, request_id, result):
+        self._forget(request_id)
+        callback, _ = self._callbacks.pop(request_id, (None, None))
+        if callback:
+            callback(result)
+
+    def _deliver_error(self, request_id, error):
+        self._forget(request_id)
+        _, errback = self._callbacks.pop(request_id, (None, None))
+        if errback:
+            errback(error)
+        else:
+            self.error.emit(error)
+
+    def _deliver_progress(self, request_id, done, total):
+        callback = self._progress_callbacks.get(request_id)
+        if callback:
+            callback(done, total)
+
+    def _forget(self, request_id):
+        self._progress_callbacks.pop(request_id, None)
+        self._cancelled.discard(request_id)
+
+
+class SnapshotWorker(QThread):
+    """Снимок базы в своём потоке и своём соединении: поток базы и окно в это время работают"""
+
+    progress = pyqtSignal(int, int)  # скопировано страниц, всего
+    done = pyqtSignal(object)  # статистика снимка
+    failed = pyqtSignal(object)
+
+    def __init__(self, db_name="tasks_v2.sqlite", parent=None):
+        super().__init__(parent)
+        self.db_name = db_name
+
+    def run(self):
+        from snapshots import take_snapshot
+        try:
+            self.done.emit(take_snapshot(self.db_name, progress=self.progress.emit))
+        except Exception as e:
+            self.failed.emit(e)